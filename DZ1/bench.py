@@ -0,0 +1,345 @@
+"""
+Бенчмарки эмулятора DZ1 на синтетических архивах.
+
+Запуск:
+    python bench.py startup --entries 1000 100000 1000000
+    python bench.py restart --entries 1000000
+    python bench.py memory --entries 1000000
+    python bench.py regress --update        # записать базовый уровень
+    python bench.py regress --threshold 0.5  # сравнить с ним
+    python bench.py rebuild --size-mb 1024
+    python bench.py dispatch --commands 10000
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import posixpath
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from emul import Emulator
+
+
+def _leaf_dir(k, width, depth):
+    """Путь k-й (по модулю числа листьев) директории нижнего уровня дерева."""
+    leaf = k % width ** depth
+    parts = []
+    for _ in range(depth):
+        parts.append(f"d{leaf % width}")
+        leaf //= width
+    return '/'.join(parts)
+
+
+def make_archive(zip_path, entries, width=10, depth=3, content=b'', empty_dirs=0):
+    """
+    Создаёт синтетический архив: entries файлов, равномерно разложенных по дереву
+    директорий шириной width и глубиной depth, и empty_dirs пустых директорий e<k> в листьях.
+    """
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zf:
+        for k in range(entries):
+            zf.writestr(_leaf_dir(k, width, depth) + f"/f{k}.txt", content)
+        for k in range(empty_dirs):
+            zf.writestr(_leaf_dir(k, width, depth) + f"/e{k}/", '')
+
+
+def _timed(func):
+    """Время выполнения func в секундах; печать команд эмулятора подавляется."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+
+def bench_startup(args):
+    """Время создания Emulator и первого ls в обычном и ленивом режимах."""
+    print(f"{'entries':>10} {'eager init, s':>14} {'lazy init, s':>13} {'lazy first ls, s':>17}")
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, 'bench.log')
+        for entries in args.entries:
+            zip_path = os.path.join(tmp, f"fs_{entries}.zip")
+            make_archive(zip_path, entries, args.width, args.depth)
+            eager = _timed(lambda: Emulator('bench', 'bench', zip_path, log_path, index_sidecar=False))
+            emulators = []
+            lazy = _timed(lambda: emulators.append(Emulator('bench', 'bench', zip_path, log_path, lazy=True)))
+            first_ls = _timed(lambda: emulators[0].ls("/d0/d0"))
+            print(f"{entries:>10} {eager:>14.4f} {lazy:>13.4f} {first_ls:>17.4f}")
+
+
+def bench_restart(args):
+    """Запуск без индекса, первый запуск со сборкой индекса и перезапуск с готовым индексом."""
+    print(f"{'entries':>10} {'no index, s':>12} {'build index, s':>15} {'restart, s':>11} "
+          f"{'restart + ls, s':>16} {'index, MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, 'bench.log')
+        for entries in args.entries:
+            zip_path = os.path.join(tmp, f"fs_{entries}.zip")
+            make_archive(zip_path, entries, args.width, args.depth)
+            plain = _timed(lambda: Emulator('bench', 'bench', zip_path, log_path, index_sidecar=False))
+            build = _timed(lambda: Emulator('bench', 'bench', zip_path, log_path))
+            emulators = []
+            restart = _timed(lambda: emulators.append(Emulator('bench', 'bench', zip_path, log_path)))
+            first_ls = _timed(lambda: emulators[0].ls("/d0/d0/d0"))
+            index_size = os.path.getsize(zip_path + '.idx') / 2 ** 20
+            print(f"{entries:>10} {plain:>12.4f} {build:>15.4f} {restart:>11.4f} "
+                  f"{restart + first_ls:>16.4f} {index_size:>10.1f}")
+
+
+def _legacy_structures(zip_path):
+    """Прежнее представление: множества полных путей директорий и файлов и словарь file_system."""
+    file_system, directories, files = {}, {'/'}, set()
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for file in zip_ref.namelist():
+            file = file.lstrip('/')
+            file_system['/' + file] = True
+            normalized_path = posixpath.normpath('/' + file)
+            if file.endswith('/'):
+                directories.add(normalized_path)
+            else:
+                files.add(normalized_path)
+                parent_path = posixpath.dirname(normalized_path)
+                while parent_path != '/':
+                    directories.add(parent_path)
+                    parent_path = posixpath.dirname(parent_path)
+    return file_system, directories, files
+
+
+def _traced(func):
+    """Память (текущая и пиковая, в байтах), которую удерживает результат func."""
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return current, peak
+
+
+def bench_memory(args):
+    """Память индекса: множества путей против дерева узлов со ссылками на записи каталога."""
+    print(f"{'entries':>10} {'sets, MB':>9} {'tree, MB':>9} {'tree peak, MB':>14} {'B/entry sets':>13} "
+          f"{'B/entry tree':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, 'bench.log')
+        for entries in args.entries:
+            zip_path = os.path.join(tmp, f"fs_{entries}.zip")
+            make_archive(zip_path, entries, args.width, args.depth)
+            legacy, _ = _traced(lambda: _legacy_structures(zip_path))
+            tree, peak = _traced(lambda: Emulator('bench', 'bench', zip_path, log_path, index_sidecar=False))
+            print(f"{entries:>10} {legacy / 2 ** 20:>9.1f} {tree / 2 ** 20:>9.1f} {peak / 2 ** 20:>14.1f} "
+                  f"{legacy / entries:>13.0f} {tree / entries:>13.0f}")
+
+
+def _regress_case(tmp, entries, width, depth, sample, repeat):
+    """
+    Время основных операций на одном синтетическом архиве; для каждой берётся лучший из repeat
+    прогонов. ls, cd и rmdir выполняются для sample путей на только что загруженном дереве.
+    _remove_from_zip лишь пишет журнал, поэтому перезапись архива измеряется как sync.
+    """
+    source = os.path.join(tmp, f"fs_{entries}_{width}_{depth}.zip")
+    make_archive(source, entries, width, depth, empty_dirs=sample)
+    zip_path, log_path = os.path.join(tmp, 'case.zip'), os.path.join(tmp, 'bench.log')
+    rng = random.Random(0)
+    dirs = ['/' + _leaf_dir(rng.randrange(width ** depth), width, depth) for _ in range(sample)]
+    empty = ['/' + _leaf_dir(k, width, depth) + f"/e{k}" for k in range(sample)]
+
+    timings = {name: float('inf') for name in ('load', 'ls', 'cd', 'rmdir', 'sync')}
+
+    def record(name, seconds):
+        timings[name] = min(timings[name], seconds)
+
+    for _ in range(repeat):
+        shutil.copyfile(source, zip_path)
+        emulator = Emulator('bench', 'bench', zip_path, log_path, index_sidecar=False)
+        record('load', _timed(emulator._load_file_system))
+        record('ls', _timed(lambda: [emulator.ls(path) for path in dirs]))
+        emulator._load_file_system()
+        record('cd', _timed(lambda: [emulator.cd(path) for path in dirs]))
+        emulator._load_file_system()
+        record('rmdir', _timed(lambda: [emulator.rmdir(path) for path in empty]))
+        record('sync', _timed(emulator.sync))
+        emulator.logger.close()
+    return timings
+
+
+def _load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def bench_regress(args):
+    """
+    Регрессионная проверка: времена операций сравниваются с базовым уровнем из JSON.
+    Возвращает 1, если какая-то операция медленнее базового уровня больше чем на threshold.
+    """
+    baseline = _load_baseline(args.baseline)
+    failures = 0
+    print(f"{'entries':>10} {'op':>6} {'time, s':>9} {'baseline, s':>12} {'ratio':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for entries in args.entries:
+            key = f"entries={entries},width={args.width},depth={args.depth},sample={args.sample}"
+            timings = _regress_case(tmp, entries, args.width, args.depth, args.sample, args.repeat)
+            expected = baseline.get(key, {})
+            for name, seconds in timings.items():
+                reference = expected.get(name)
+                if reference is None:
+                    status, reference_text, ratio = "new", '-', ''
+                else:
+                    slower = seconds > reference * (1 + args.threshold) and seconds - reference > args.min_delta
+                    status = "SLOWER" if slower else "ok"
+                    reference_text = f"{reference:.4f}"
+                    ratio = f"{seconds / reference:.2f}" if reference else ''
+                    failures += slower and not args.update
+                print(f"{entries:>10} {name:>6} {seconds:>9.4f} {reference_text:>12} {ratio:>6} {status}")
+            if args.update:
+                baseline[key] = timings
+
+    if args.update:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f"baseline written to {args.baseline}")
+    elif failures:
+        print(f"{failures} operation(s) slower than baseline by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+def _recompress_rebuild(zip_path, file_to_remove):
+    """Прежний способ удаления: каждая запись распаковывается и сжимается заново."""
+    temp_zip = zip_path + '.temp'
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        with zipfile.ZipFile(temp_zip, 'w') as new_zip:
+            for item in zip_ref.infolist():
+                normalized_item = posixpath.normpath('/' + item.filename.lstrip('/'))
+                if not (normalized_item == file_to_remove or normalized_item.startswith(file_to_remove + '/')):
+                    new_zip.writestr(item, zip_ref.read(item.filename))
+    os.replace(temp_zip, zip_path)
+
+
+def bench_rebuild(args):
+    """Удаление одной директории из архива: пересжатие против побайтового копирования."""
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, 'fs.zip')
+        members = max(1, args.size_mb // args.member_mb)
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for k in range(members):
+                # base64 от случайных байт сжимается примерно на четверть, как типичные данные
+                payload = base64.b64encode(os.urandom(args.member_mb * 3 << 18))
+                zf.writestr(f"data/d{k % 16}/blob{k}.bin", payload)
+            zf.writestr('trash/', '')
+        print(f"archive: {members} members, {os.path.getsize(zip_path) / 2 ** 20:.0f} MB on disk")
+
+        copy_path = os.path.join(tmp, 'fs_copy.zip')
+        shutil.copyfile(zip_path, copy_path)
+        recompress = _timed(lambda: _recompress_rebuild(copy_path, '/trash'))
+
+        emulator = Emulator('bench', 'bench', zip_path, os.path.join(tmp, 'bench.log'))
+        _timed(lambda: emulator.rmdir('/trash'))
+        raw = _timed(emulator.sync)
+        print(f"recompress: {recompress:.2f} s, raw copy: {raw:.2f} s, speedup x{recompress / raw:.1f}")
+
+
+def _legacy_dispatch(emulator, command):
+    """Прежний диспетчер GUI: цепочка startswith с повторным split в каждой ветке."""
+    command = command.strip()
+    if command.startswith("ls"):
+        args = command.split(" ")
+        return emulator.ls(args[1]) if len(args) == 2 else emulator.ls()
+    elif command.startswith("cd "):
+        return emulator.cd(command[3:])
+    elif command == "cd":
+        return emulator.cd('/')
+    elif command.startswith("rmdir"):
+        args = command.split(" ")
+        return emulator.rmdir(args[1]) if len(args) == 2 else emulator.rmdir()
+    elif command.startswith("uname"):
+        args = command.split(" ")
+        return emulator.uname(args[1]) if len(args) == 2 else emulator.uname()
+    elif command == "sync":
+        return emulator.sync()
+    elif command == "exit":
+        return "Exiting emulator..."
+    else:
+        return "Unknown command."
+
+
+def bench_dispatch(args):
+    """Накладные расходы диспетчера на смеси команд; сами обработчики заменены заглушками."""
+    mix = ['ls', 'ls d0', 'cd d1', 'cd', 'rmdir d2', 'uname -n', 'sync', 'lsblk', 'frobnicate x']
+    rng = random.Random(0)
+    commands = [rng.choice(mix) for _ in range(args.commands)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, 'fs.zip')
+        make_archive(zip_path, 100, args.width, args.depth)
+        emulator = Emulator('bench', 'bench', zip_path, os.path.join(tmp, 'bench.log'))
+
+    def noop(*_args):
+        return ""
+
+    for name in ('ls', 'cd', 'rmdir', 'uname', 'sync'):
+        setattr(emulator, name, noop)
+    emulator._handlers = {name: (noop, lo, hi) for name, (_, lo, hi) in emulator._handlers.items()}
+
+    legacy = _timed(lambda: [_legacy_dispatch(emulator, c) for c in commands])
+    table = _timed(lambda: [emulator.execute_command(c) for c in commands])
+    per_command = 1e6 / len(commands)
+    print(f"{len(commands)} commands: startswith chain {legacy * per_command:.2f} us/cmd, "
+          f"table {table * per_command:.2f} us/cmd")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Бенчмарки эмулятора')
+    parser.add_argument('--width', type=int, default=10, help='Число поддиректорий на уровне')
+    parser.add_argument('--depth', type=int, default=3, help='Глубина дерева директорий')
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    startup = subparsers.add_parser('startup', help='Время запуска в обычном и ленивом режимах')
+    startup.add_argument('--entries', type=int, nargs='+', default=[1000, 10000, 100000])
+    startup.set_defaults(func=bench_startup)
+
+    restart = subparsers.add_parser('restart', help='Перезапуск с индексом-спутником')
+    restart.add_argument('--entries', type=int, nargs='+', default=[1000, 10000, 100000])
+    restart.set_defaults(func=bench_restart)
+
+    memory = subparsers.add_parser('memory', help='Память индекса (tracemalloc) против множеств путей')
+    memory.add_argument('--entries', type=int, nargs='+', default=[10000, 100000])
+    memory.set_defaults(func=bench_memory)
+
+    regress = subparsers.add_parser('regress', help='Сравнение времени операций с базовым уровнем')
+    regress.add_argument('--entries', type=int, nargs='+', default=[10000, 100000])
+    regress.add_argument('--sample', type=int, default=200, help='Число путей для ls, cd и rmdir')
+    regress.add_argument('--repeat', type=int, default=3, help='Число прогонов, берётся лучший')
+    regress.add_argument('--baseline', type=str,
+                         default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baseline.json'),
+                         help='JSON с базовым уровнем')
+    regress.add_argument('--threshold', type=float, default=0.25,
+                         help='Допустимое замедление относительно базового уровня (0.25 - на 25%%)')
+    regress.add_argument('--min-delta', type=float, default=0.005,
+                         help='Замедление меньше этого числа секунд не считается регрессией')
+    regress.add_argument('--update', action='store_true', help='Записать результаты как новый базовый уровень')
+    regress.set_defaults(func=bench_regress)
+
+    rebuild = subparsers.add_parser('rebuild', help='Перезапись архива после rmdir')
+    rebuild.add_argument('--size-mb', type=int, default=1024, help='Объём несжатых данных в архиве')
+    rebuild.add_argument('--member-mb', type=int, default=4, help='Размер одной записи')
+    rebuild.set_defaults(func=bench_rebuild)
+
+    dispatch = subparsers.add_parser('dispatch', help='Накладные расходы диспетчера команд')
+    dispatch.add_argument('--commands', type=int, default=10000, help='Число команд в смеси')
+    dispatch.set_defaults(func=bench_dispatch)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
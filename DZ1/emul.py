@@ -2,13 +2,802 @@ import os
 import zipfile
 import argparse
 import sys
-import tkinter as tk
-from tkinter import scrolledtext
+import atexit
+import queue
+import threading
+import time
+import codecs
+import contextlib
+import fnmatch
+import hashlib
+import itertools
+import mmap
 import posixpath
+import struct
+from array import array
+from collections import deque
+from collections.abc import MutableSet
+from functools import lru_cache
+
+try:
+    import tkinter as tk
+    from tkinter import scrolledtext
+except ImportError:  # Без Tk остаётся доступен пакетный режим
+    tk = None
+
+
+class _CentralDirectory:
+    """
+    Компактная таблица записей центрального каталога ZIP архива.
+
+    При создании читается только запись конца каталога, поэтому время открытия не зависит
+    от числа записей. При первом обращении каталог отображается в память прямо из архива
+    (без копирования в память процесса); для каждой записи хранится лишь её смещение,
+    а имена и ZipInfo декодируются по запросу.
+    """
+
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        with open(zip_path, 'rb') as fp:
+            endrec = zipfile._EndRecData(fp)
+        if not endrec:
+            raise zipfile.BadZipFile("File is not a zip file")
+        self.size = endrec[zipfile._ECD_SIZE]  # Размер каталога в байтах
+        # concat отличен от нуля, если перед архивом дописаны посторонние данные
+        self.concat = endrec[zipfile._ECD_LOCATION] - self.size - endrec[zipfile._ECD_OFFSET]
+        if endrec[zipfile._ECD_SIGNATURE] == zipfile.stringEndArchive64:
+            self.concat -= zipfile.sizeEndCentDir64 + zipfile.sizeEndCentDir64Locator
+        self.start = endrec[zipfile._ECD_OFFSET] + self.concat
+        self.count = endrec[zipfile._ECD_ENTRIES_TOTAL]
+        self._mm = None
+        self._data = None
+        self._offsets = None
+
+    def __len__(self):
+        return self.count
+
+    def read(self):
+        """Исходные байты центрального каталога (срез отображения архива в память)."""
+        if self._data is None:
+            with open(self.zip_path, 'rb') as fp:
+                self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            self._data = memoryview(self._mm)[self.start:self.start + self.size]
+        return self._data
+
+    def close(self):
+        """Закрывает отображение архива; после этого записи читать нельзя."""
+        if self._mm is not None:
+            self._data.release()
+            self._mm.close()
+            self._mm = self._data = None
+
+    def _load(self):
+        """Строит таблицу смещений записей каталога."""
+        data = self.read()
+        offsets = array('Q')
+        pos = 0
+        while pos < len(data):
+            if data[pos:pos + 4] != zipfile.stringCentralDir:
+                raise zipfile.BadZipFile("Bad magic number for central directory")
+            offsets.append(pos)
+            name_len, extra_len, comment_len = struct.unpack_from('<HHH', data, pos + 28)
+            pos += zipfile.sizeCentralDir + name_len + extra_len + comment_len
+        self._offsets = offsets
+        self.count = len(offsets)
+
+    def name(self, index):
+        """Имя записи в том виде, в котором оно хранится в архиве."""
+        if self._offsets is None:
+            self._load()
+        pos = self._offsets[index]
+        flags, = struct.unpack_from('<H', self._data, pos + 8)
+        name_len, = struct.unpack_from('<H', self._data, pos + 28)
+        raw = self._data[pos + zipfile.sizeCentralDir:pos + zipfile.sizeCentralDir + name_len]
+        return str(raw, 'utf-8' if flags & 0x800 else 'cp437')
+
+    def info(self, index):
+        """Собирает ZipInfo для записи так же, как это делает zipfile при открытии архива."""
+        if self._offsets is None:
+            self._load()
+        pos = self._offsets[index]
+        centdir = struct.unpack_from(zipfile.structCentralDir, self._data, pos)
+        x = zipfile.ZipInfo(self.name(index))
+        pos += zipfile.sizeCentralDir + centdir[zipfile._CD_FILENAME_LENGTH]
+        x.extra = bytes(self._data[pos:pos + centdir[zipfile._CD_EXTRA_FIELD_LENGTH]])
+        pos += centdir[zipfile._CD_EXTRA_FIELD_LENGTH]
+        x.comment = bytes(self._data[pos:pos + centdir[zipfile._CD_COMMENT_LENGTH]])
+        x.header_offset = centdir[zipfile._CD_LOCAL_HEADER_OFFSET]
+        (x.create_version, x.create_system, x.extract_version, x.reserved,
+         x.flag_bits, x.compress_type, t, d,
+         x.CRC, x.compress_size, x.file_size) = centdir[1:12]
+        x.volume, x.internal_attr, x.external_attr = centdir[15:18]
+        x._raw_time = t
+        x.date_time = ((d >> 9) + 1980, (d >> 5) & 0xF, d & 0x1F, t >> 11, (t >> 5) & 0x3F, (t & 0x1F) * 2)
+        _decode_zip64_extra(x)
+        x.header_offset += self.concat
+        return x
+
+    def record(self, index):
+        """Исходные байты записи каталога."""
+        if self._offsets is None:
+            self._load()
+        pos = self._offsets[index]
+        name_len, extra_len, comment_len = struct.unpack_from('<HHH', self._data, pos + 28)
+        return bytes(self._data[pos:pos + zipfile.sizeCentralDir + name_len + extra_len + comment_len])
+
+    def sizes(self, index):
+        """Сжатый и исходный размеры записи без сборки ZipInfo."""
+        if self._offsets is None:
+            self._load()
+        compress_size, file_size = struct.unpack_from('<LL', self._data, self._offsets[index] + 20)
+        if compress_size == 0xFFFFFFFF or file_size == 0xFFFFFFFF:
+            info = self.info(index)  # Настоящие размеры лежат в поле ZIP64
+            return info.compress_size, info.file_size
+        return compress_size, file_size
+
+    def entry(self, index):
+        """Нормализованный абсолютный путь записи и признак того, что это директория."""
+        file = self.name(index).lstrip('/')
+        return posixpath.normpath('/' + file), file.endswith('/')
+
+    def expand(self, node, pending):
+        """Раскладывает отложенные записи узла по его непосредственным потомкам."""
+        depth = node.path.count('/') if node.parent is not None else 0
+        for index in pending:
+            path, is_dir = self.entry(index)
+            parts = path.split('/')
+            if len(parts) <= depth + 1:
+                continue  # Запись самой директории
+            name = parts[depth + 1]
+            if not name:
+                continue
+            if len(parts) == depth + 2 and not is_dir:
+                node._files[name] = index
+                continue
+            child = node._dirs.get(name)
+            if child is None:
+                child = node._dirs[name] = _DirNode(name, node, self)
+            if len(parts) > depth + 2:
+                child._pending.append(index)
+
+
+def _decode_zip64_extra(info):
+    """Подставляет 64-битные размеры и смещение из дополнительного поля ZIP64."""
+    extra = info.extra
+    while len(extra) >= 4:
+        tp, ln = struct.unpack_from('<HH', extra)
+        if tp == 0x0001:
+            data = extra[4:ln + 4]
+            if info.file_size == 0xFFFFFFFF:
+                info.file_size, = struct.unpack_from('<Q', data)
+                data = data[8:]
+            if info.compress_size == 0xFFFFFFFF:
+                info.compress_size, = struct.unpack_from('<Q', data)
+                data = data[8:]
+            if info.header_offset == 0xFFFFFFFF:
+                info.header_offset, = struct.unpack_from('<Q', data)
+        extra = extra[ln + 4:]
+
+
+def _member_span(fp, info):
+    """
+    Длина записи в архиве: локальный заголовок, сжатые данные и дескриптор данных, если он есть.
+    """
+    fp.seek(info.header_offset)
+    fheader = fp.read(zipfile.sizeFileHeader)
+    if len(fheader) != zipfile.sizeFileHeader or fheader[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad magic number for file header of {info.filename}")
+    fheader = struct.unpack(zipfile.structFileHeader, fheader)
+    name_length = fheader[zipfile._FH_FILENAME_LENGTH]
+    extra_length = fheader[zipfile._FH_EXTRA_FIELD_LENGTH]
+    span = zipfile.sizeFileHeader + name_length + extra_length + info.compress_size
+    if info.flag_bits & 0x08:
+        # Размеры в дескрипторе 8-байтные, если в локальном заголовке есть поле ZIP64,
+        # даже когда сами размеры малы (запись потоком с force_zip64)
+        fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length)
+        extra = fp.read(extra_length)
+        zip64 = False
+        while len(extra) >= 4:
+            tp, ln = struct.unpack_from('<HH', extra)
+            if tp == 0x0001:
+                zip64 = True
+                break
+            extra = extra[ln + 4:]
+        # Дескриптор данных: необязательная сигнатура, CRC и два размера (4 или 8 байт)
+        fp.seek(info.header_offset + span)
+        has_signature = fp.read(4) == b'PK\x07\x08'
+        span += (4 if has_signature else 0) + 4 + (16 if zip64 else 8)
+    return span
+
+
+def _patch_header_offset(record, offset):
+    """Возвращает копию записи каталога с новым смещением локального заголовка."""
+    record = bytearray(record)
+    if struct.unpack_from('<L', record, 42)[0] != 0xFFFFFFFF:
+        struct.pack_into('<L', record, 42, offset)
+        return bytes(record)
+    # Смещение хранится в поле ZIP64 после тех размеров, что тоже вынесены туда
+    file_size, compress_size = struct.unpack_from('<LL', record, 20)
+    name_len, extra_len = struct.unpack_from('<HH', record, 28)
+    pos = zipfile.sizeCentralDir + name_len
+    end = pos + extra_len
+    while pos + 4 <= end:
+        tp, ln = struct.unpack_from('<HH', record, pos)
+        if tp == 0x0001:
+            field = pos + 4 + 8 * ((file_size == 0xFFFFFFFF) + (compress_size == 0xFFFFFFFF))
+            struct.pack_into('<Q', record, field, offset)
+            break
+        pos += 4 + ln
+    return bytes(record)
+
+
+def _rebuild_archive(central_directory, dst_path, keep):
+    """
+    Собирает новый архив из записей с номерами keep, копируя локальные заголовки и сжатые
+    данные байт в байт по смещениям из ZipInfo. Центральный каталог пишется заново из исходных
+    записей с исправленными смещениями, поэтому затраты CPU зависят от размера каталога,
+    а не от объёма данных.
+    """
+    records = []
+    with open(central_directory.zip_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        for index in keep:
+            info = central_directory.info(index)
+            span = _member_span(src, info)
+            records.append(_patch_header_offset(central_directory.record(index), dst.tell()))
+            src.seek(info.header_offset)
+            while span > 0:
+                chunk = src.read(min(span, 1 << 20))
+                if not chunk:
+                    raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+                dst.write(chunk)
+                span -= len(chunk)
+
+        start_dir = dst.tell()
+        for record in records:
+            dst.write(record)
+        end_dir = dst.tell()
+        count, size_dir = len(records), end_dir - start_dir
+        if count > zipfile.ZIP_FILECOUNT_LIMIT or start_dir > zipfile.ZIP64_LIMIT or size_dir > zipfile.ZIP64_LIMIT:
+            dst.write(struct.pack(zipfile.structEndArchive64, zipfile.stringEndArchive64,
+                                  44, 45, 45, 0, 0, count, count, size_dir, start_dir))
+            dst.write(struct.pack(zipfile.structEndArchive64Locator, zipfile.stringEndArchive64Locator,
+                                  0, end_dir, 1))
+            count = min(count, 0xFFFF)
+            size_dir = min(size_dir, 0xFFFFFFFF)
+            start_dir = min(start_dir, 0xFFFFFFFF)
+        dst.write(struct.pack(zipfile.structEndArchive, zipfile.stringEndArchive,
+                              0, 0, count, count, size_dir, start_dir, 0))
+
+
+class _TreeIndex:
+    """
+    Компактный индекс дерева директорий в виде плоских таблиц.
+
+    Узлы записаны в порядке обхода в ширину: потомки каждой директории лежат подряд
+    и отсортированы по имени. Для узла хранятся номер родителя, диапазон потомков, номер
+    записи центрального каталога и положение имени в пуле; одинаковые имена из разных
+    директорий лежат в пуле один раз. Отдельно сохраняются смещения записей каталога.
+    Объекты _DirNode создаются из таблиц только для директорий, к которым было обращение.
+
+    Индекс строится в памяти или хранится рядом с архивом (<архив>.idx) и при следующих
+    запусках отображается в память. Файл индекса действителен, пока совпадают размер
+    и mtime архива и хэш его центрального каталога.
+    """
+
+    MAGIC = b'DZ1INDEX'
+    VERSION = 2
+    # Сигнатура, версия, выравнивание, размер архива, mtime_ns, хэш каталога,
+    # число узлов, число записей каталога, размер пула имён
+    HEADER = struct.Struct('<8sIIQQ16sQQQ')
+    # Таблицы идут от самых широких элементов к самым узким, поэтому все они выровнены
+    TABLES = (('_name_offset', 'Q', 'nodes'), ('_cd_offsets', 'Q', 'entries'),
+              ('_parent', 'i', 'nodes'), ('_first', 'I', 'nodes'), ('_count', 'I', 'nodes'),
+              ('_entry', 'i', 'nodes'), ('_name_length', 'H', 'nodes'), ('_kind', 'B', 'nodes'))
+    NO_KEY = (0, 0, bytes(16))  # Ключ индекса, построенного только в памяти
+
+    def __init__(self, buf, central_directory):
+        self._buf = buf
+        _, _, _, _, _, _, nodes, entries, pool = self.HEADER.unpack_from(buf)
+        counts = {'nodes': nodes, 'entries': entries}
+        view = memoryview(buf)
+        pos = self.HEADER.size
+        self._views = [view]
+        for name, fmt, count in self.TABLES:
+            size = struct.calcsize(fmt) * counts[count]
+            table = view[pos:pos + size].cast(fmt)
+            setattr(self, name, table)
+            self._views.append(table)
+            pos += size
+        self._pool = view[pos:pos + pool]
+        self._views.append(self._pool)
+        self.nodes = nodes
+        self.central_directory = central_directory
+        # Таблица смещений каталога берётся из индекса вместо повторного разбора
+        central_directory._offsets = self._cd_offsets
+        central_directory.count = entries
+
+    @classmethod
+    def _size(cls, nodes, entries, pool):
+        return cls.HEADER.size + sum(struct.calcsize(fmt) for _, fmt, _ in cls.TABLES
+                                     if fmt != 'Q') * nodes + 8 * (nodes + entries) + pool
+
+    @staticmethod
+    def path_for(zip_path):
+        return zip_path + '.idx'
+
+    @classmethod
+    def build(cls, central_directory, key=NO_KEY):
+        """Строит индекс по центральному каталогу в памяти."""
+        return cls(cls._serialize(central_directory, key), central_directory)
+
+    @classmethod
+    def load(cls, zip_path):
+        """
+        Открывает индекс архива из файла рядом с ним; отсутствующий или устаревший файл
+        строится заново. Если записать файл не удалось (например, каталог только для чтения),
+        возвращается индекс, построенный в памяти.
+        """
+        central_directory = _CentralDirectory(zip_path)
+        stat = os.stat(zip_path)
+        key = (stat.st_size, stat.st_mtime_ns, hashlib.sha1(central_directory.read()).digest()[:16])
+        path = cls.path_for(zip_path)
+        buf = cls._map(path, key)
+        if buf is not None:
+            return cls(buf, central_directory)
+        central_directory._load()
+        buf = cls._serialize(central_directory, key)
+        temp_path = path + '.temp'
+        try:
+            with open(temp_path, 'wb') as fp:
+                fp.write(buf)
+            os.replace(temp_path, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            return cls(buf, central_directory)
+        mapped = cls._map(path, key)
+        return cls(mapped if mapped is not None else buf, central_directory)
+
+    @classmethod
+    def _map(cls, path, key):
+        """Отображает файл индекса в память, если его ключ совпадает с ключом архива."""
+        try:
+            with open(path, 'rb') as fp:
+                buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # Файла нет или он пуст
+            return None
+        if len(buf) >= cls.HEADER.size:
+            magic, version, _, size, mtime_ns, digest, nodes, entries, pool = cls.HEADER.unpack_from(buf)
+            if (magic == cls.MAGIC and version == cls.VERSION and (size, mtime_ns, digest) == key
+                    and len(buf) == cls._size(nodes, entries, pool)):
+                return buf
+        buf.close()
+        return None
+
+    @classmethod
+    def _serialize(cls, central_directory, key):
+        """Раскладывает записи каталога по таблицам индекса и возвращает его байты."""
+        # Промежуточное дерево: узел директории - [номер записи, директории, файлы]
+        tree = [-1, {}, {}]
+        for index in range(len(central_directory)):
+            entry_path, is_dir = central_directory.entry(index)
+            parts = [name for name in entry_path.split('/') if name]
+            if not parts:
+                continue
+            node = tree
+            for name in parts[:-1]:
+                node = node[1].setdefault(name, [-1, {}, {}])
+            if is_dir:
+                node[1].setdefault(parts[-1], [-1, {}, {}])[0] = index
+            else:
+                node[2][parts[-1]] = index
+
+        pool = bytearray()
+        offsets = {}  # Имя -> смещение в пуле << 16 | длина; каждое имя хранится один раз
+        name_offset, name_length = array('Q', [0]), array('H', [0])
+        parent, first, count = array('i', [-1]), array('I', [0]), array('I', [0])
+        entry, kind = array('i', [-1]), bytearray(b'\x01')
+        order = [tree]
+        pos = 0
+        while pos < len(order):
+            node = order[pos]
+            order[pos] = None  # Разобранный узел промежуточного дерева больше не нужен
+            if node is not None:
+                first[pos] = len(order)
+                children = sorted([(name, 1, child) for name, child in node[1].items()]
+                                  + [(name, 0, child) for name, child in node[2].items()],
+                                  key=lambda child: child[:2])
+                count[pos] = len(children)
+                for name, is_dir, child in children:
+                    location = offsets.get(name)
+                    if location is None:
+                        raw = name.encode('utf-8')
+                        location = offsets[name] = len(pool) << 16 | len(raw)
+                        pool += raw
+                    name_offset.append(location >> 16)
+                    name_length.append(location & 0xFFFF)
+                    parent.append(pos)
+                    first.append(0)
+                    count.append(0)
+                    entry.append(child[0] if is_dir else child)
+                    kind.append(is_dir)
+                    order.append(child if is_dir else None)
+            pos += 1
+
+        tables = {'_name_offset': name_offset, '_cd_offsets': central_directory._offsets,
+                  '_parent': parent, '_first': first, '_count': count, '_entry': entry,
+                  '_name_length': name_length, '_kind': kind}
+        buf = bytearray(cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, *key,
+                                        len(order), len(central_directory), len(pool)))
+        for name, _, _ in cls.TABLES:
+            buf += tables[name]
+        buf += pool
+        return buf
+
+    def root(self):
+        """Корневой узел дерева; потомки создаются из индекса при первом обращении."""
+        node = _DirNode('', source=self)
+        node._pending = 0
+        return node
+
+    def expand(self, node, index):
+        """Создаёт непосредственных потомков узла индекса с номером index."""
+        name_offset, name_length, kind, pool = self._name_offset, self._name_length, self._kind, self._pool
+        start = self._first[index]
+        for child in range(start, start + self._count[index]):
+            offset = name_offset[child]
+            name = str(pool[offset:offset + name_length[child]], 'utf-8')
+            if kind[child]:
+                sub = node._dirs[name] = _DirNode(name, node, self)
+                sub._pending = child
+            else:
+                node._files[name] = self._entry[child]
+
+    def close(self):
+        """Освобождает буфер индекса и каталог; нераскрытые узлы после этого использовать нельзя."""
+        self.central_directory._offsets = None
+        self.central_directory.close()
+        for view in self._views:
+            view.release()
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._buf = None
+
+
+class _DirNode:
+    """
+    Узел дерева директорий: хранит дочерние директории и файлы одной папки.
+
+    Узел может быть ленивым: тогда в нём лежат только номера записей каталога, относящихся
+    к его поддереву (или номер узла в индексе-спутнике), а дочерние узлы создаются
+    при первом обращении к dirs или files.
+
+    Полный путь в узле не хранится и собирается по цепочке родителей, а файлы
+    представлены номерами записей центрального каталога; ZipInfo создаётся по запросу.
+    """
+
+    __slots__ = ('name', 'parent', '_dirs', '_files', '_source', '_pending')
+
+    def __init__(self, name, parent=None, source=None):
+        self.name = name
+        self.parent = parent
+        self._dirs = {}  # Имя -> _DirNode
+        self._files = {}  # Имя -> номер записи каталога (-1, если записи в архиве нет)
+        self._source = source  # _CentralDirectory или _TreeIndex, пока узел не раскрыт
+        self._pending = [] if source is not None else None  # Номера записей поддерева или узла индекса
+
+    @property
+    def path(self):
+        """Абсолютный путь директории."""
+        if self.parent is None:
+            return '/'
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return '/' + '/'.join(reversed(names))
+
+    @property
+    def dirs(self):
+        if self._pending is not None:
+            self._expand()
+        return self._dirs
+
+    @property
+    def files(self):
+        if self._pending is not None:
+            self._expand()
+        return self._files
+
+    def _expand(self):
+        """Создаёт непосредственных потомков узла из источника (каталога архива или индекса)."""
+        pending, source = self._pending, self._source
+        self._pending = self._source = None
+        source.expand(self, pending)
+
+
+class _PathSetView(MutableSet):
+    """
+    Представление дерева директорий в виде множества абсолютных путей.
+    Сохраняет прежний интерфейс атрибутов Emulator.directories и Emulator.files.
+    """
+
+    def __init__(self, emulator, dirs):
+        self._emulator = emulator
+        self._dirs = dirs  # True - директории, False - файлы
+
+    def __contains__(self, path):
+        if not isinstance(path, str):
+            return False
+        if self._dirs:
+            return self._emulator._find_dir(path) is not None
+        parent = self._emulator._find_dir(posixpath.dirname(path))
+        return parent is not None and posixpath.basename(path) in self._emulator._subfiles(parent)
+
+    def __iter__(self):
+        for node in self._emulator._iter_dir_nodes():
+            if self._dirs:
+                yield node.path
+            else:
+                prefix = node.path if node.parent is not None else ''
+                for name in self._emulator._subfiles(node):
+                    yield prefix + '/' + name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def add(self, path):
+        path = posixpath.normpath(path)
+        self._emulator._hidden.discard(path)
+        if self._dirs:
+            self._emulator._make_dirs(path)
+        else:
+            self._emulator._make_dirs(posixpath.dirname(path)).files.setdefault(posixpath.basename(path), -1)
+
+    def discard(self, path):
+        # Удалённые пути скрываются в сессии, само дерево не меняется
+        path = posixpath.normpath(path)
+        if path != '/' and path in self:
+            self._emulator._hidden.add(path)
+
+
+class SessionLogger:
+    """
+    Буферизованный лог сессии. Команды складываются в ограниченную очередь, а фоновый поток
+    держит файл открытым и сбрасывает накопленное на диск по объёму или по таймеру.
+    При заполнении очереди write блокируется, пока поток не догонит поступающие записи.
+    """
+
+    def __init__(self, log_path, max_queue=10000, flush_bytes=64 * 1024, flush_interval=1.0, fsync_every=0):
+        """
+        :param log_path: Путь к файлу лога
+        :param max_queue: Максимальное число записей, ожидающих в очереди
+        :param flush_bytes: Объём буфера, после которого он сбрасывается в файл
+        :param flush_interval: Максимальное время (в секундах) хранения записи в буфере
+        :param fsync_every: Вызывать fsync после каждых N записей (0 - не вызывать)
+        """
+        self.log_path = log_path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.fsync_every = fsync_every
+        self.fsync_count = 0  # Сколько раз был вызван fsync
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._error = None  # Ошибка записи в файл, случившаяся в фоновом потоке
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        """
+        Ставит текст в очередь на запись. При первом вызове открывает файл (ошибка открытия
+        возникает здесь же) и запускает поток записи. Ошибка записи из потока поднимается
+        при следующем вызове.
+        """
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    log_file = open(self.log_path, 'a')
+                    self._thread = threading.Thread(target=self._run, args=(log_file,), name='session-logger',
+                                                    daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+        self._raise_error()
+        self._put(text)
+
+    def flush(self):
+        """Дожидается, пока все поставленные в очередь записи окажутся в файле."""
+        self._control(stop=False)
+
+    def close(self):
+        """Сбрасывает очередь, закрывает файл и останавливает поток записи."""
+        with self._lock:
+            if self._thread is None:
+                return
+            try:
+                self._control(stop=True)
+            finally:
+                self._thread.join()
+                self._thread = None
+                atexit.unregister(self.close)
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _put(self, item):
+        # Не ждём места в очереди бесконечно, если поток записи уже завершился
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    self._raise_error()
+                    raise RuntimeError('Поток записи лога остановлен')
+
+    def _control(self, stop):
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._put((done, stop))
+        while not done.wait(0.1):
+            if not self._thread.is_alive():
+                break
+        self._raise_error()
+
+    def _run(self, log_file):
+        """
+        Цикл фонового потока: копит записи и пишет их в файл пачками. После ошибки записи
+        новые записи отбрасываются, но flush и close по-прежнему получают ответ.
+        """
+        buffer, size, deadline, unsynced = [], 0, None, 0
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # Истёк таймер сброса
+
+            if isinstance(item, str) and self._error is None:
+                buffer.append(item)
+                size += len(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if size < self.flush_bytes:
+                    continue
+
+            if buffer:
+                try:
+                    log_file.write(''.join(buffer))
+                    log_file.flush()
+                    unsynced += len(buffer)
+                    if self.fsync_every and unsynced >= self.fsync_every:
+                        os.fsync(log_file.fileno())
+                        self.fsync_count += 1
+                        unsynced = 0
+                except Exception as e:
+                    self._error = e
+                buffer, size, deadline = [], 0, None
+
+            if isinstance(item, tuple):
+                done, stop = item
+                if stop:
+                    break
+                done.set()
+        # Ошибка закрытия файла тоже должна дойти до вызвавшего close
+        try:
+            log_file.close()
+        except Exception as e:
+            if self._error is None:
+                self._error = e
+        done.set()
+
+
+@lru_cache(maxsize=4096)
+def _normalize_path(current_directory, path):
+    """
+    Нормализованный абсолютный путь для path относительно current_directory.
+    Результат зависит только от строк аргументов, а не от содержимого архива, поэтому
+    кэш остаётся верным после rmdir: существование директории проверяется уже по дереву.
+    """
+    if posixpath.isabs(path):
+        full_path = posixpath.normpath(path)
+    else:
+        combined_path = posixpath.join(current_directory, path)
+        full_path = posixpath.normpath(combined_path)
+
+    if full_path == '':
+        full_path = '/'
+
+    # Убедиться, что путь начинается с '/'
+    if not full_path.startswith('/'):
+        full_path = '/' + full_path
+
+    return full_path
+
+
+def _parse_options(args, flags=(), valued=()):
+    """
+    Разбирает аргументы команды на позиционные и опции.
+    Возвращает (список позиционных аргументов, словарь опций); флаги получают значение True.
+    Неизвестная опция или опция без значения приводят к ValueError.
+    """
+    positional, options = [], {}
+    args = iter(args)
+    for arg in args:
+        if arg in flags:
+            options[arg] = True
+        elif arg in valued:
+            value = next(args, None)
+            if value is None:
+                raise ValueError(f"option '{arg}' requires a value")
+            options[arg] = value
+        elif arg.startswith('-') and arg != '-':
+            raise ValueError(f"unknown option '{arg}'")
+        else:
+            positional.append(arg)
+    return positional, options
+
+
+READ_CHUNK = 64 * 1024  # Размер блока при потоковом чтении файлов архива
+MAX_LINE = 1024 * 1024  # Строки длиннее (в символах) выдаются частями
+
+
+def _iter_lines(chunks):
+    """
+    Превращает поток блоков байт в поток строк текста без завершающих переводов строки.
+    Куски незаконченной строки копятся в списке и склеиваются один раз; строка длиннее
+    MAX_LINE символов выдаётся частями, чтобы память не зависела от её длины.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    parts = []  # Куски текущей строки
+    size = 0  # Их суммарная длина
+    split = False  # Текущая строка - продолжение уже выданной части
+    for chunk in chunks:
+        *lines, rest = decoder.decode(chunk).split('\n')
+        if lines:
+            parts.append(lines[0])
+            lines[0] = ''.join(parts)
+            if split and not lines[0]:
+                del lines[0]  # Длинная строка закончилась ровно на границе части
+            yield from lines
+            parts, size, split = [], 0, False
+        if rest:
+            parts.append(rest)
+            size += len(rest)
+            if size >= MAX_LINE:
+                yield ''.join(parts)
+                parts, size, split = [], 0, True
+    parts.append(decoder.decode(b'', final=True))
+    rest = ''.join(parts)
+    if rest:
+        yield rest
+
+
+def _tokenize(command):
+    """Единый разбор строки ввода: имя команды и аргументы, разделённые пробелами."""
+    return command.split()
 
 
 class Emulator:
-    def __init__(self, username, hostname, zip_path, log_path):
+    # Таблица команд: имя -> (имя метода, минимум аргументов, максимум аргументов)
+    COMMANDS = {
+        'ls': ('ls', 0, 1),
+        'cd': ('cd', 0, 1),
+        'rmdir': ('rmdir', 0, 1),
+        'uname': ('uname', 0, 1),
+        'find': ('find', 0, 5),
+        'du': ('du', 0, 3),
+        'tree': ('tree', 0, 1),
+        'cat': ('cat', 1, 1),
+        'head': ('head', 1, 3),
+        'tail': ('tail', 1, 3),
+        'sync': ('sync', 0, 0),
+        'exit': ('_exit_session', 0, 0),
+    }
+
+    def __init__(self, username, hostname, zip_path, log_path, lazy=False, logger=None, shared_with=None,
+                 index_sidecar=True):
         """
         Конструктор класса Emulator. Инициализирует пользователя, ПК, путь к архиву файловой системы и файл лога.
 
@@ -16,89 +805,179 @@ class Emulator:
         :param hostname: Имя компьютера
         :param zip_path: Путь к архиву файловой системы (ZIP)
         :param log_path: Путь к файлу лога
+        :param lazy: Строить узлы директорий только при первом обращении к ним
+        :param logger: Лог сессии (по умолчанию SessionLogger для log_path)
+        :param shared_with: Эмулятор, чьё дерево директорий сессия использует только для чтения;
+                            архив при этом не загружается повторно, а удаления видны лишь в этой сессии
+        :param index_sidecar: Хранить индекс дерева в файле рядом с архивом (<архив>.idx)
+                              и открывать его при следующих запусках (в ленивом режиме не используется)
         """
         self.username = username
         self.hostname = hostname
         self.current_directory = '/'  # Текущая директория (начинаем с корня '/')
         self.zip_path = zip_path
         self.log_path = log_path
-        self.file_system = {}  # Словарь для хранения распакованных файлов и папок
-        self.directories = set()  # Множество директорий
-        self.files = set()  # Множество файлов
-        self._load_file_system()  # Распаковываем архив в память
+        self.logger = logger if logger is not None else SessionLogger(log_path)
+        self.lazy = lazy
+        self.index_sidecar = index_sidecar
+        self._tree_index = None  # _TreeIndex, на который ссылаются нераскрытые узлы
+        self._tombstones = []  # Журнал удалённых путей, ещё не применённых к архиву
+        self._hidden = set()  # Пути, удалённые в этой сессии поверх общего дерева
+        self._reader = None  # Открытый ZipFile для чтения содержимого файлов
+        self._shared_with = shared_with
+        # Обработчики команд связываются с экземпляром один раз
+        self._handlers = {name: (getattr(self, method), min_args, max_args)
+                          for name, (method, min_args, max_args) in self.COMMANDS.items()}
+        self._central_directory = None  # Каталог архива, на записи которого ссылаются файлы дерева
+        self.root = _DirNode('')  # Корень дерева директорий
+        if shared_with is not None:
+            # Общий индекс, архив уже загружен
+            self.root = shared_with.root
+            self._central_directory = shared_with._central_directory
+        else:
+            self._load_file_system()  # Распаковываем архив в память
 
-    def _log(self, command, output):
+    def _log(self, command, output, prompt=None):
         """
         Метод для записи команды пользователя и вывода программы в лог-файл.
 
         :param command: Ввод пользователя
         :param output: Вывод программы
+        :param prompt: Приглашение, в котором была введена команда (по умолчанию текущее)
         """
-        with open(self.log_path, 'a') as log_file:
-            # Записываем ввод команды с текущим местоположением пользователя
-            log_file.write(f"{self.username}@{self.hostname}:{self._get_prompt_directory()}$ {command}\n")
-            # Записываем результат команды
-            if output:
-                log_file.write(f"{output}\n")
+        if prompt is None:
+            prompt = self._get_prompt()
+        # Записываем ввод команды с текущим местоположением пользователя и её результат
+        record = f"{prompt} {command}\n"
+        if output:
+            record += f"{output}\n"
+        self.logger.write(record)
+
+    def _get_prompt(self):
+        """Метод для получения строки приглашения вида user@host:/dir$."""
+        return f"{self.username}@{self.hostname}:{self._get_prompt_directory()}$"
 
     def _get_prompt_directory(self):
         """Метод для получения текущей директории для отображения в prompt."""
         return self.current_directory if self.current_directory != '/' else '/'
 
+    @property
+    def file_system(self):
+        """
+        Словарь путей всех записей архива (с ведущим '/', как они записаны в архиве).
+        Строится по запросу из центрального каталога и постоянно в памяти не хранится.
+        """
+        central_directory = self._central_directory
+        if central_directory is None:
+            return {}
+        return {'/' + central_directory.name(index).lstrip('/'): True for index in range(len(central_directory))}
+
+    @property
+    def directories(self):
+        """Множество всех директорий (представление дерева)."""
+        return _PathSetView(self, True)
+
+    @property
+    def files(self):
+        """Множество всех файлов (представление дерева)."""
+        return _PathSetView(self, False)
+
     def _load_file_system(self):
         """
         Метод для распаковки ZIP архива в виртуальную файловую систему.
+        Оглавление архива за один проход раскладывается в компактные таблицы _TreeIndex,
+        из которых узлы директорий создаются при первом обращении к ним. С индексом-спутником
+        таблицы при повторных запусках открываются из отображённого в память файла.
+        В ленивом режиме читается только конец каталога: спутник не проверяется и не строится,
+        иначе запуск снова стал бы линейным по числу записей.
         """
         if zipfile.is_zipfile(self.zip_path):
-            with zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
-                self.file_system = {}
-                self.directories = set()
-                self.files = set()
-                self.directories.add('/')  # Добавляем корневую директорию
-
-                for file in zip_ref.namelist():
-                    # Удаляем начальные / для удобства работы с файлами
-                    file = file.lstrip('/')
-                    normalized_path = '/' + file
-
-                    self.file_system[normalized_path] = True
-
-                    normalized_path = posixpath.normpath(normalized_path)
-
-                    if file.endswith('/'):
-                        # Это директория
-                        self.directories.add(normalized_path)
-                    else:
-                        # Это файл
-                        self.files.add(normalized_path)
-
-                        # Добавляем все родительские директории
-                        parent_path = posixpath.dirname(normalized_path)
-                        while parent_path != '/':
-                            self.directories.add(parent_path)
-                            parent_path = posixpath.dirname(parent_path)
-                        self.directories.add('/')  # Убедимся, что корень всегда присутствует
+            self._hidden = set()
+            self._close_index()
+
+            if self.lazy:
+                central_directory = self._central_directory = _CentralDirectory(self.zip_path)
+                self.root = _DirNode('', source=central_directory)  # Корневая директория
+                self.root._pending = range(len(central_directory))
+                return
+            if self.index_sidecar:
+                self._tree_index = _TreeIndex.load(self.zip_path)
+            else:
+                self._tree_index = _TreeIndex.build(_CentralDirectory(self.zip_path))
+            self._central_directory = self._tree_index.central_directory
+            self.root = self._tree_index.root()  # Корневая директория
         else:
             print("Error: provided file is not a ZIP archive.")
 
-    def _get_full_path(self, path):
+    def _close_index(self):
+        """Освобождает отображения индекса и каталога архива перед его перезаписью."""
+        if self._tree_index is not None:
+            self._tree_index.close()
+            self._tree_index = None
+        elif self._central_directory is not None:
+            self._central_directory.close()
+        self._central_directory = None
+
+    def _make_dirs(self, path):
         """
-        Помощник для получения нормализованного абсолютного пути.
+        Возвращает узел директории по абсолютному пути, создавая недостающие узлы.
         """
-        if posixpath.isabs(path):
-            full_path = posixpath.normpath(path)
-        else:
-            combined_path = posixpath.join(self.current_directory, path)
-            full_path = posixpath.normpath(combined_path)
+        node = self.root
+        for name in path.split('/'):
+            if name:
+                child = node.dirs.get(name)
+                if child is None:
+                    child = node.dirs[name] = _DirNode(name, node)
+                elif self._hidden:
+                    self._hidden.discard(child.path)
+                node = child
+        return node
 
-        if full_path == '':
-            full_path = '/'
+    def _find_dir(self, path):
+        """
+        Возвращает узел директории по абсолютному пути или None, если её нет.
+        Время поиска пропорционально глубине пути, а не размеру архива.
+        """
+        node = self.root
+        hidden = self._hidden
+        for name in path.split('/'):
+            if name and name != '.':
+                node = node.dirs.get(name)
+                if node is None or hidden and node.path in hidden:
+                    return None
+        return node
 
-        # Убедиться, что путь начинается с '/'
-        if not full_path.startswith('/'):
-            full_path = '/' + full_path
+    def _subdirs(self, node):
+        """Поддиректории узла, видимые в этой сессии."""
+        if not self._hidden:
+            return node.dirs
+        return {name: child for name, child in node.dirs.items() if child.path not in self._hidden}
 
-        return full_path
+    def _subfiles(self, node):
+        """Файлы узла, видимые в этой сессии."""
+        if not self._hidden:
+            return node.files
+        prefix = node.path if node.parent is not None else ''
+        return {name: info for name, info in node.files.items() if prefix + '/' + name not in self._hidden}
+
+    def _iter_dir_nodes(self):
+        """Обход всех узлов-директорий дерева в глубину (без рекурсии)."""
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(self._subdirs(node).values())
+
+    def _get_full_path(self, path):
+        """
+        Помощник для получения нормализованного абсолютного пути.
+        """
+        return _normalize_path(self.current_directory, path)
+
+    @staticmethod
+    def path_cache_info():
+        """Статистика кэша нормализации путей: hits, misses, maxsize, currsize."""
+        return _normalize_path.cache_info()
 
     def ls(self, directory=None):
         """
@@ -109,23 +988,12 @@ class Emulator:
         else:
             path = self.current_directory
 
+        # Непосредственные потомки берутся прямо из узла директории
+        node = self._find_dir(path)
         entries = set()
-        dir_prefix = path if path != '/' else ''
-        dir_prefix += '/'
-        len_prefix = len(dir_prefix)
-
-        # Ищем непосредственных потомков в директориях
-        for d in self.directories:
-            if d.startswith(dir_prefix):
-                rest = d[len_prefix:]
-                if '/' not in rest and rest != '':
-                    entries.add(rest)
-        # Ищем файлы
-        for f in self.files:
-            if f.startswith(dir_prefix):
-                rest = f[len_prefix:]
-                if '/' not in rest:
-                    entries.add(rest)
+        if node is not None:
+            entries.update(self._subdirs(node))
+            entries.update(self._subfiles(node))
 
         if entries:
             output = sorted(entries)
@@ -136,11 +1004,11 @@ class Emulator:
         print(response)
         return response
 
-    def cd(self, path):
+    def cd(self, path='/'):
         """
         Команда 'cd' позволяет перемещаться между директориями.
 
-        :param path: Путь к новой директории
+        :param path: Путь к новой директории (без аргумента - корень)
         """
         if path == '':
             response = "Error: path cannot be empty."
@@ -157,8 +1025,9 @@ class Emulator:
 
         new_directory = self._get_full_path(path)
 
-        if new_directory in self.directories:
-            self.current_directory = new_directory
+        node = self._find_dir(new_directory)
+        if node is not None:
+            self.current_directory = node.path
         else:
             response = "Error: directory not found."
             print(response)
@@ -184,17 +1053,16 @@ class Emulator:
             print(response)
             return response
 
-        # Проверяем, есть ли в директории другие файлы или директории
-        has_entries = any(
-            (f != full_path and f.startswith(full_path + '/'))
-            for f in self.files.union(self.directories)
-        )
+        node = self._find_dir(full_path)
 
-        if has_entries:
+        # Проверяем, есть ли в директории другие файлы или директории
+        if node is not None and (self._subdirs(node) or self._subfiles(node)):
             response = f"Error: directory '{path}' is not empty. Remove all files inside first."
-        elif full_path in self.directories:
-            self.directories.remove(full_path)
-            self._remove_from_zip(full_path)  # Удаляем директорию из ZIP-архива
+        elif node is not None:
+            # Узел скрывается только в этой сессии: общее дерево не меняется (копирование при записи)
+            self._hidden.add(node.path)
+            if self._shared_with is None:
+                self._remove_from_zip(full_path)  # Удаляем директорию из ZIP-архива
             response = f"Directory '{path}' has been removed."
         else:
             response = "Error: directory not found."
@@ -205,18 +1073,304 @@ class Emulator:
     def _remove_from_zip(self, file_to_remove):
         """
         Метод для удаления файла или директории из ZIP архива.
+        Удаление только записывается в журнал; сам архив перезаписывается в sync.
         """
+        self._tombstones.append(file_to_remove)
+
+    def _is_removed(self, path, tombstones):
+        """Проверяет, попадает ли путь или одна из его родительских директорий в журнал удалений."""
+        while path != '/':
+            if path in tombstones:
+                return True
+            path = posixpath.dirname(path)
+        return False
+
+    def sync(self):
+        """
+        Команда 'sync' применяет накопленные удаления к архиву за один проход.
+        Сохранившиеся записи копируются в сжатом виде, без распаковки и повторного сжатия.
+        """
+        if self._shared_with is not None:
+            return "Error: sync is not available in a shared session."
+        if not self._tombstones:
+            return ""
+
+        tombstones = set(self._tombstones)
         temp_zip = self.zip_path + '.temp'  # Временный файл для нового архива
-        with zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
-            with zipfile.ZipFile(temp_zip, 'w') as new_zip:
-                for item in zip_ref.infolist():
-                    # Проверяем, что файл или папка не совпадают с удаляемым
-                    normalized_item = '/' + item.filename.lstrip('/')
-                    normalized_item = posixpath.normpath(normalized_item)
-                    if not (normalized_item == file_to_remove or normalized_item.startswith(file_to_remove + '/')):
-                        new_zip.writestr(item, zip_ref.read(item.filename))
-        # Заменяем старый архив новым
+        central_directory = _CentralDirectory(self.zip_path)
+        # Проверяем, что файл или папка не попадают под удаление
+        keep = [index for index in range(len(central_directory))
+                if not self._is_removed(central_directory.entry(index)[0], tombstones)]
+        _rebuild_archive(central_directory, temp_zip, keep)
+        central_directory.close()
+        # Заменяем старый архив новым; его отображения в память закрываются заранее
+        self._close_reader()
+        self._close_index()
         os.replace(temp_zip, self.zip_path)
+        self._tombstones.clear()
+
+        # Смещения записей изменились, поэтому индекс строится заново
+        current_directory = self.current_directory
+        self._load_file_system()
+        if self._find_dir(current_directory) is None:
+            self.current_directory = '/'
+        return ""
+
+    def _walk(self, node):
+        """
+        Итеративный обход поддерева в глубину, общий для find, du и tree.
+        Генератор выдаёт кортежи (путь, имя, глубина, узел или номер записи файла, последний ли элемент
+        в своей директории). Директория выдаётся раньше своего содержимого, элементы одной
+        директории - по алфавиту; в памяти держится только стек ещё не пройденных элементов.
+        """
+        stack = [(node.path, node.name, 0, node, True)]
+        while stack:
+            item = stack.pop()
+            yield item
+            path, _, depth, entry, _ = item
+            if isinstance(entry, _DirNode):
+                prefix = path if path != '/' else ''
+                children = sorted(list(self._subdirs(entry).items()) + list(self._subfiles(entry).items()),
+                                  key=lambda child: child[0])
+                for position in range(len(children) - 1, -1, -1):
+                    name, child = children[position]
+                    stack.append((prefix + '/' + name, name, depth + 1, child, position == len(children) - 1))
+
+    def find(self, *args):
+        """
+        Команда 'find [путь] [-name шаблон] [-type f|d]' выводит все пути поддерева,
+        подходящие под условия. Результат выдаётся построчно по мере обхода.
+        """
+        try:
+            paths, options = _parse_options(args, valued=('-name', '-type'))
+        except ValueError as error:
+            return f"Error: find: {error}"
+        if len(paths) > 1 or options.get('-type', 'd') not in ('f', 'd'):
+            return "Error: find: usage: find [path] [-name pattern] [-type f|d]"
+        node = self._find_dir(self._get_full_path(paths[0]) if paths else self.current_directory)
+        if node is None:
+            return "Error: directory not found."
+        return self._iter_find(node, options.get('-name'), options.get('-type'))
+
+    def _iter_find(self, node, pattern, kind):
+        for path, name, _, entry, _ in self._walk(node):
+            is_dir = isinstance(entry, _DirNode)
+            if kind == 'f' and is_dir or kind == 'd' and not is_dir:
+                continue
+            if pattern is not None and not fnmatch.fnmatchcase(name, pattern):
+                continue
+            yield path
+
+    def du(self, *args):
+        """
+        Команда 'du [-s] [--compressed] [путь]' выводит суммарный размер файлов каждой директории.
+        Размеры берутся из оглавления архива (file_size или, с --compressed, compress_size),
+        содержимое файлов не читается. С -s выводится только итог для указанной директории.
+        """
+        try:
+            paths, options = _parse_options(args, flags=('-s', '--compressed'))
+        except ValueError as error:
+            return f"Error: du: {error}"
+        if len(paths) > 1:
+            return "Error: du: usage: du [-s] [--compressed] [path]"
+        node = self._find_dir(self._get_full_path(paths[0]) if paths else self.current_directory)
+        if node is None:
+            return "Error: directory not found."
+        return self._iter_du(node, '--compressed' in options, '-s' in options)
+
+    def _iter_du(self, node, compressed, summarize):
+        # Стек открытых директорий [путь, глубина, сумма]; директория выводится, когда обход
+        # выходит из её поддерева, поэтому порядок вывода как у du: потомки раньше родителя
+        open_dirs = []
+
+        def close_until(depth):
+            while open_dirs and open_dirs[-1][1] >= depth:
+                path, dir_depth, total = open_dirs.pop()
+                if open_dirs:
+                    open_dirs[-1][2] += total
+                if not summarize or dir_depth == 0:
+                    yield f"{total}\t{path}"
+
+        for path, _, depth, entry, _ in self._walk(node):
+            yield from close_until(depth)
+            if isinstance(entry, _DirNode):
+                open_dirs.append([path, depth, 0])
+            else:
+                open_dirs[-1][2] += self._file_size(entry, compressed)
+        yield from close_until(0)
+
+    def tree(self, path=None):
+        """
+        Команда 'tree [путь]' рисует поддерево директории и в конце выводит число директорий и файлов.
+        """
+        node = self._find_dir(self._get_full_path(path) if path else self.current_directory)
+        if node is None:
+            return "Error: directory not found."
+        return self._iter_tree(node)
+
+    def _iter_tree(self, node):
+        directories = files = 0
+        branches = []  # Для каждого уровня: закончилась ли уже ветка родителя
+        for path, name, depth, entry, last in self._walk(node):
+            if depth == 0:
+                yield path
+                continue
+            del branches[depth - 1:]
+            yield ''.join('    ' if done else '│   ' for done in branches) + ('└── ' if last else '├── ') + name
+            branches.append(last)
+            if isinstance(entry, _DirNode):
+                directories += 1
+            else:
+                files += 1
+        yield ""
+        yield f"{directories} directories, {files} files"
+
+    def _file_size(self, index, compressed=False):
+        """Размер файла из записи каталога (сжатый или исходный)."""
+        if index < 0:
+            return 0  # Файл есть только в дереве, но не в архиве
+        return self._central_directory.sizes(index)[0 if compressed else 1]
+
+    def _file_info(self, name, index):
+        """ZipInfo файла по номеру записи каталога."""
+        if index < 0:
+            return zipfile.ZipInfo(name)  # Пустой файл, которого нет в архиве
+        return self._central_directory.info(index)
+
+    def _find_file(self, path):
+        """
+        Возвращает ZipInfo файла по пути или строку с ошибкой, если это не файл архива.
+        """
+        full_path = self._get_full_path(path)
+        parent = self._find_dir(posixpath.dirname(full_path))
+        name = posixpath.basename(full_path)
+        index = self._subfiles(parent).get(name) if parent is not None else None
+        if index is None:
+            if self._find_dir(full_path) is not None:
+                return f"Error: '{path}' is a directory."
+            return "Error: file not found."
+        return self._file_info(name, index)
+
+    def _get_reader(self):
+        """ZipFile для чтения сжатых файлов; открывается один раз на архив."""
+        if self._shared_with is not None:
+            return self._shared_with._get_reader()
+        if self._reader is None:
+            self._reader = zipfile.ZipFile(self.zip_path, 'r')
+        return self._reader
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _is_mappable(self, info):
+        """Несжатые и незашифрованные файлы читаются напрямую из отображения архива в память."""
+        return info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x01
+
+    def _data_range(self, mm, info):
+        """Границы данных файла внутри архива: сразу после его локального заголовка."""
+        fheader = struct.unpack_from(zipfile.structFileHeader, mm, info.header_offset)
+        if fheader[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad magic number for file header of {info.filename}")
+        start = (info.header_offset + zipfile.sizeFileHeader
+                 + fheader[zipfile._FH_FILENAME_LENGTH] + fheader[zipfile._FH_EXTRA_FIELD_LENGTH])
+        return start, start + info.compress_size
+
+    def _iter_chunks(self, info):
+        """
+        Содержимое файла блоками по READ_CHUNK байт. Несжатые файлы отдаются срезами mmap
+        архива без копирования, остальные читаются потоком через ZipFile.open.
+        """
+        if info.file_size == 0:
+            return  # Пустой файл
+        if not self._is_mappable(info):
+            with self._get_reader().open(info) as member:
+                while True:
+                    chunk = member.read(READ_CHUNK)
+                    if not chunk:
+                        return
+                    yield chunk
+        with open(self.zip_path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start, end = self._data_range(mm, info)
+            view = memoryview(mm)
+            chunk = None
+            try:
+                for pos in range(start, end, READ_CHUNK):
+                    chunk = view[pos:min(pos + READ_CHUNK, end)]
+                    yield chunk
+                    chunk.release()
+            finally:
+                # Срезы должны быть освобождены до закрытия mmap
+                if chunk is not None:
+                    chunk.release()
+                view.release()
+
+    def cat(self, path):
+        """
+        Команда 'cat' выводит содержимое файла построчно, не загружая его в память целиком.
+        """
+        info = self._find_file(path)
+        if isinstance(info, str):
+            return info
+        return _iter_lines(self._iter_chunks(info))
+
+    def head(self, *args):
+        """
+        Команда 'head [-n N] файл' выводит первые N строк файла (по умолчанию 10).
+        Чтение прекращается, как только нужные строки получены.
+        """
+        parsed = self._parse_line_count('head', args)
+        if isinstance(parsed, str):
+            return parsed
+        info, count = parsed
+        return itertools.islice(_iter_lines(self._iter_chunks(info)), count)
+
+    def tail(self, *args):
+        """
+        Команда 'tail [-n N] файл' выводит последние N строк файла (по умолчанию 10).
+        Для несжатых файлов строки ищутся с конца данных в mmap архива, без чтения всего файла;
+        сжатые файлы проходятся потоком, в памяти держатся только последние N строк.
+        """
+        parsed = self._parse_line_count('tail', args)
+        if isinstance(parsed, str):
+            return parsed
+        info, count = parsed
+        if info.file_size == 0 or count == 0:
+            return iter(())
+        if self._is_mappable(info):
+            return self._iter_tail_mapped(info, count)
+        return iter(deque(_iter_lines(self._iter_chunks(info)), maxlen=count))
+
+    def _iter_tail_mapped(self, info, count):
+        with open(self.zip_path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start, end = self._data_range(mm, info)
+            # Завершающий перевод строки не начинает новую строку
+            pos = end - 1 if mm[end - 1:end] == b'\n' else end
+            for _ in range(count):
+                pos = mm.rfind(b'\n', start, pos)
+                if pos < 0:
+                    pos = start - 1
+                    break
+            tail = mm[pos + 1:end]
+        yield from _iter_lines([tail])
+
+    def _parse_line_count(self, name, args):
+        """Разбор аргументов head/tail: возвращает (ZipInfo, число строк) или строку с ошибкой."""
+        try:
+            paths, options = _parse_options(args, valued=('-n',))
+        except ValueError as error:
+            return f"Error: {name}: {error}"
+        count = options.get('-n', '10')
+        if not count.isdigit():
+            return f"Error: {name}: invalid number of lines: '{count}'"
+        count = int(count)
+        if len(paths) != 1:
+            return f"Error: {name}: usage: {name} [-n N] file"
+        info = self._find_file(paths[0])
+        if isinstance(info, str):
+            return info
+        return info, count
 
     def uname(self, args=None):
         """
@@ -237,17 +1391,51 @@ class Emulator:
         else:
             return "Unknown option"
 
+    def execute_command(self, command):
+        """
+        Метод для выполнения команды по строке ввода. Общий для GUI и пакетного режима.
+        Команда разбивается на слова один раз, обработчик ищется по имени в таблице COMMANDS.
+        Команды с большим выводом (find, du, tree, cat, head, tail) возвращают не строку,
+        а итератор строк.
+        """
+        args = _tokenize(command)
+        handler = self._handlers.get(args[0]) if args else None
+        if handler is None:
+            return "Unknown command."
+        method, min_args, max_args = handler
+        if not min_args <= len(args) - 1 <= max_args:
+            return f"Error: {args[0]}: wrong number of arguments."
+        return method(*args[1:])
+
+    def _exit_session(self):
+        """Команда 'exit': сохраняет изменения в архив перед завершением сессии."""
+        if self._shared_with is None:
+            self.sync()
+        return "Exiting emulator..."
+
     def exit_emulator(self):
         """
         Метод выхода из эмулятора. Вносим изменения прямо в архив.
         """
+        self.sync()
+        self.logger.close()
         print("All changes saved to the archive.")
         exit()
 
 
 class EmulatorGUI:
-    def __init__(self, emulator):
+    def __init__(self, emulator, max_lines=10000, trim_chunk=1000):
+        """
+        :param emulator: Эмулятор, команды которого выполняет окно
+        :param max_lines: Максимальное число строк в области вывода
+        :param trim_chunk: Сколько старых строк удаляется за раз при переполнении
+        """
         self.emulator = emulator
+        self.max_lines = max_lines
+        self.trim_chunk = trim_chunk
+        # Вывод, ещё не перенесённый в виджет; старше max_lines записей хранить незачем
+        self._pending_output = deque(maxlen=max_lines)
+        self._redraw_scheduled = False
 
         # Создаем главное окно
         self.window = tk.Tk()
@@ -261,7 +1449,7 @@ class EmulatorGUI:
 
         # Область для отображения текущего хоста и директории (нередактируемая)
         self.host_display = tk.Label(self.window,
-                                     text=f"{emulator.username}@{emulator.hostname}:{emulator._get_prompt_directory()}$",
+                                     text=emulator._get_prompt(),
                                      bg="black", fg="green", font=("Consolas", 12), anchor="w")
         self.host_display.grid(row=2, column=0, sticky='w', padx=10, pady=5)
 
@@ -279,62 +1467,99 @@ class EmulatorGUI:
     def run_command(self, event):
         """Обработчик ввода команды и её выполнения."""
         command = self.command_entry.get()
-        self.output_text.config(state='normal')
-        self.output_text.insert(tk.END,
-                                f"{self.emulator.username}@{self.emulator.hostname}:{self.emulator._get_prompt_directory()}$ {command}\n")
-        self.output_text.config(state='disabled')
-        with open(self.emulator.log_path, 'a') as log_file:
-            # Записываем ввод команды с текущим местоположением пользователя
-            log_file.write(
-                f"{self.emulator.username}@{self.emulator.hostname}:{self.emulator._get_prompt_directory()}$ {command}\n")
+        prompt = self.emulator._get_prompt()
         self.command_entry.delete(0, tk.END)  # Очищаем поле ввода
 
-        # Получаем результат команды из эмулятора
+        # Получаем результат команды из эмулятора и записываем его в лог одной записью
         output = self.execute_command(command)
-        with open(self.emulator.log_path, 'a') as log_file:
-            if output:
-                log_file.write(f"{output}\n")
-        # Обновляем область вывода
-
-        self.host_display.config(
-            text=f"{self.emulator.username}@{self.emulator.hostname}:{self.emulator._get_prompt_directory()}$")
-        self.host_display.update()
+        self.emulator._log(command, output, prompt)
+        if command.strip() == "exit":
+            return  # Окно уже закрыто
+
+        # Вывод копится и переносится в виджет одной перерисовкой, когда Tk освободится
+        self._pending_output.append(f"{prompt} {command}\n{output}\n" if output else f"{prompt} {command}\n")
+        if not self._redraw_scheduled:
+            self._redraw_scheduled = True
+            self.window.after_idle(self._redraw)
+
+    def _redraw(self):
+        """Переносит накопленный вывод в виджет и обрезает самые старые строки пачками."""
+        self._redraw_scheduled = False
+        self.host_display.config(text=self.emulator._get_prompt())
         self.output_text.config(state='normal')
-        if output:
-            self.output_text.insert(tk.END, f"{output}\n")
+        self.output_text.insert(tk.END, ''.join(self._pending_output))
+        self._pending_output.clear()
+        # Вывод заканчивается переводом строки, поэтому 'end-1c' стоит на пустой строке после последней
+        lines = int(self.output_text.index('end-1c').split('.')[0]) - 1
+        if lines > self.max_lines:
+            # Удаляются строки с первой по указанную (не включая её)
+            self.output_text.delete('1.0', f"{lines - self.max_lines + self.trim_chunk + 1}.0")
         self.output_text.config(state='disabled')
         self.output_text.yview(tk.END)  # Прокрутка вниз
 
     def execute_command(self, command):
         """Метод для выполнения команд через эмулятор."""
-        command = command.strip()
-        if command.startswith("ls"):
-            args = command.split(" ")
-            if len(args) == 2:
-                return self.emulator.ls(args[1])
-            else:
-                return self.emulator.ls()
-        elif command.startswith("cd "):
-            return self.emulator.cd(command[3:])
-        elif command == "cd":
-            return self.emulator.cd('/')
-        elif command.startswith("rmdir"):
-            args = command.split(" ")
-            if len(args) == 2:
-                return self.emulator.rmdir(args[1])
-            else:
-                return self.emulator.rmdir()
-        elif command.startswith("uname"):
-            args = command.split(" ")
-            if len(args) == 2:
-                return self.emulator.uname(args[1])
-            else:
-                return self.emulator.uname()
-        elif command == "exit":
+        output = self.emulator.execute_command(command)
+        if not isinstance(output, str):
+            # Больше max_lines строк окно всё равно не покажет: остаток файла не читается
+            output = '\n'.join(itertools.islice(output, self.max_lines))
+        if command.strip() == "exit":
             self.window.destroy()
-            return "Exiting emulator..."
-        else:
-            return "Unknown command."
+        return output
+
+
+def _percentile(sorted_values, fraction):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def run_batch(emulator, commands, out):
+    """
+    Пакетный режим без графического интерфейса: выполняет команды из потока commands
+    тем же диспетчером, что и GUI, пишет вывод в out и в лог сессии.
+    Возвращает список задержек выполнения каждой команды в секундах.
+
+    :param emulator: Эмулятор, на котором выполняются команды
+    :param commands: Итерируемый источник строк с командами (файл или stdin)
+    :param out: Поток для вывода результатов
+    """
+    latencies = []
+    # Команды эмулятора дублируют результат через print; в пакетном режиме вывод идёт только в out
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for line in commands:
+            command = line.rstrip('\n')
+            if not command.strip():
+                continue
+            prompt = emulator._get_prompt()
+            start = time.perf_counter()
+            output = emulator.execute_command(command)
+            out.write(f"{prompt} {command}\n")
+            if isinstance(output, str):
+                if output:
+                    out.write(f"{output}\n")
+                emulator._log(command, output, prompt)
+            else:
+                # Потоковый вывод: строки уходят в out и в лог по мере получения
+                emulator._log(command, '', prompt)
+                for output_line in output:
+                    out.write(f"{output_line}\n")
+                    emulator.logger.write(f"{output_line}\n")
+            latencies.append(time.perf_counter() - start)
+            if command.strip() == "exit":
+                break
+    return latencies
+
+
+def report_batch_bench(latencies, elapsed, out):
+    """Печатает пропускную способность и задержки пакетного прогона."""
+    ordered = sorted(latencies)
+    rate = len(ordered) / elapsed if elapsed > 0 else 0.0
+    out.write(f"commands: {len(ordered)}, elapsed: {elapsed:.3f} s, throughput: {rate:.0f} cmd/s\n")
+    out.write(f"latency p50: {_percentile(ordered, 0.50) * 1e6:.1f} us, "
+              f"p99: {_percentile(ordered, 0.99) * 1e6:.1f} us\n")
 
 
 if __name__ == "__main__":
@@ -344,6 +1569,14 @@ if __name__ == "__main__":
     parser.add_argument('--hostname', type=str, default='my_pc', help='Имя хоста')
     parser.add_argument('--zip-path', type=str, default='virtual_fs.zip', help='Путь к zip-файлу')
     parser.add_argument('--log-path', type=str, default='emulator.log', help='Путь к файлу логов')
+    parser.add_argument('--lazy', action='store_true', help='Загружать директории архива по мере обращения (без индекса-спутника)')
+    parser.add_argument('--no-index', action='store_true',
+                        help='Не сохранять индекс дерева рядом с архивом (<архив>.idx)')
+    parser.add_argument('--log-fsync-every', type=int, default=0,
+                        help='Вызывать fsync лога после каждых N команд (0 - не вызывать)')
+    parser.add_argument('--batch', type=str, help='Выполнить команды из файла без GUI ("-" - из stdin)')
+    parser.add_argument('--bench', action='store_true',
+                        help='В пакетном режиме вывести число команд в секунду и задержки p50/p99')
 
     args = parser.parse_args()
 
@@ -353,7 +1586,25 @@ if __name__ == "__main__":
     log_path = args.log_path
 
     # Создаем объект эмулятора
-    emulator = Emulator(username, hostname, zip_path, log_path)
+    logger = SessionLogger(log_path, fsync_every=args.log_fsync_every)
+    emulator = Emulator(username, hostname, zip_path, log_path, lazy=args.lazy, logger=logger,
+                        index_sidecar=not args.no_index)
 
-    # Запускаем графический интерфейс
-    gui = EmulatorGUI(emulator)
\ No newline at end of file
+    if args.batch:
+        # Пакетный режим: команды из файла или stdin, без графического интерфейса
+        started = time.perf_counter()
+        if args.batch == '-':
+            latencies = run_batch(emulator, sys.stdin, sys.stdout)
+        else:
+            with open(args.batch) as commands:
+                latencies = run_batch(emulator, commands, sys.stdout)
+        elapsed = time.perf_counter() - started
+        emulator.sync()
+        if args.bench:
+            report_batch_bench(latencies, elapsed, sys.stderr)
+    else:
+        # Запускаем графический интерфейс
+        gui = EmulatorGUI(emulator)
+        # Окно могли закрыть кнопкой, минуя команду exit: отложенные удаления применяются здесь
+        emulator.sync()
+    logger.close()
\ No newline at end of file
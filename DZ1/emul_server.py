@@ -0,0 +1,176 @@
+"""
+Многопользовательский сервер эмулятора DZ1 на asyncio.
+
+Архив загружается один раз; все сессии используют его дерево директорий только для чтения.
+У каждой сессии свои текущая директория и удалённые (скрытые) пути.
+
+Запуск:
+    python emul_server.py serve --zip-path virtual_fs.zip --port 2323
+    python emul_server.py load-test --zip-path virtual_fs.zip --sessions 200
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+
+from emul import Emulator, SessionLogger
+
+
+class EmulatorServer:
+    def __init__(self, zip_path, log_path, hostname='my_pc', username='user1', lazy=False):
+        """
+        :param zip_path: Путь к архиву файловой системы (ZIP)
+        :param log_path: Путь к общему логу всех сессий
+        :param hostname: Имя хоста в приглашении
+        :param username: Имя пользователя в приглашении
+        :param lazy: Загружать директории архива по мере обращения
+        """
+        self.username = username
+        self.logger = SessionLogger(log_path)
+        # Эмулятор-владелец индекса: единственный, кто читает архив
+        self.index = Emulator(username, hostname, zip_path, log_path, lazy=lazy, logger=self.logger)
+        self.sessions = 0  # Число открытых сессий
+
+    def new_session(self):
+        """Создаёт сессию поверх общего индекса."""
+        return Emulator(self.username, self.index.hostname, self.index.zip_path, self.index.log_path,
+                        logger=self.logger, shared_with=self.index)
+
+    async def handle(self, reader, writer):
+        """Построчный протокол: сервер шлёт приглашение, клиент - команду, сервер - её вывод."""
+        session = self.new_session()
+        self.sessions += 1
+        try:
+            while True:
+                prompt = session._get_prompt()
+                writer.write(f"{prompt} ".encode())
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors='replace').rstrip('\r\n')
+                if not command.strip():
+                    continue
+                output = session.execute_command(command)
+                if isinstance(output, str):
+                    if output:
+                        writer.write(f"{output}\n".encode())
+                    session._log(command, output, prompt)
+                else:
+                    session._log(command, '', prompt)
+                    for output_line in output:
+                        writer.write(f"{output_line}\n".encode())
+                        session.logger.write(f"{output_line}\n")
+                        await writer.drain()
+                if command.strip() == "exit":
+                    break
+        finally:
+            self.sessions -= 1
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def start(self, host, port, backlog=100):
+        return await asyncio.start_server(self.handle, host, port, backlog=backlog)
+
+
+async def _run_client(host, port, commands, ready, hold):
+    """Сессия нагрузочного клиента: выполняет команды и держит соединение до сигнала hold."""
+    reader, writer = await asyncio.open_connection(host, port)
+    await reader.readuntil(b'$ ')
+    for command in commands:
+        writer.write(f"{command}\n".encode())
+        await reader.readuntil(b'$ ')
+    ready.put_nowait(None)
+    await hold.wait()
+    writer.write(b"exit\n")
+    await writer.drain()
+    await reader.read()
+    writer.close()
+    await writer.wait_closed()
+
+
+def _run_script(session, commands):
+    for command in commands:
+        output = session.execute_command(command)
+        if not isinstance(output, str):
+            for _ in output:
+                pass
+
+
+async def load_test(args):
+    """
+    Нагрузочный тест: время загрузки общего индекса, память на одну сессию
+    и скорость открытия N одновременных сессий через сокет.
+    """
+    started = time.perf_counter()
+    server = EmulatorServer(args.zip_path, args.log_path, lazy=args.lazy)
+    index_time = time.perf_counter() - started
+    commands = ['ls', 'cd /', 'ls', 'uname', 'cd ..'] * max(1, args.commands // 5)
+    _run_script(server.new_session(), commands)  # Ленивые узлы раскрываются один раз, до замеров
+
+    # Память считается без сокетов, чтобы в неё не попали буферы клиентов
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [server.new_session() for _ in range(args.sessions)]
+    for session in sessions:
+        _run_script(session, commands)
+    per_session = (tracemalloc.get_traced_memory()[0] - before) / args.sessions
+    tracemalloc.stop()
+    del sessions
+
+    listener = await server.start('127.0.0.1', 0, backlog=args.sessions)
+    port = listener.sockets[0].getsockname()[1]
+    ready, hold = asyncio.Queue(), asyncio.Event()
+    started = time.perf_counter()
+    clients = [asyncio.create_task(_run_client('127.0.0.1', port, commands, ready, hold))
+               for _ in range(args.sessions)]
+    # Все сессии выполнили свои команды и открыты одновременно
+    for _ in range(args.sessions):
+        await ready.get()
+    elapsed = time.perf_counter() - started
+    hold.set()
+    await asyncio.gather(*clients)
+    listener.close()
+    await listener.wait_closed()
+    server.logger.close()
+
+    print(f"index load: {index_time:.3f} s", file=sys.stderr)
+    print(f"sessions: {args.sessions}, {args.sessions / elapsed:.0f} sessions/s, "
+          f"{per_session / 1024:.1f} KiB per session", file=sys.stderr)
+
+
+async def serve(args):
+    server = EmulatorServer(args.zip_path, args.log_path, args.hostname, args.username, args.lazy)
+    listener = await server.start(args.host, args.port)
+    print(f"Serving {args.zip_path} on {args.host}:{args.port}", file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сервер эмулятора файловой системы')
+    parser.add_argument('--zip-path', type=str, default='virtual_fs.zip', help='Путь к zip-файлу')
+    parser.add_argument('--log-path', type=str, default='emulator.log', help='Путь к файлу логов')
+    parser.add_argument('--lazy', action='store_true', help='Загружать директории архива по мере обращения')
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Запустить сервер')
+    serve_parser.add_argument('--host', type=str, default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=2323)
+    serve_parser.add_argument('--username', type=str, default='user1', help='Имя пользователя')
+    serve_parser.add_argument('--hostname', type=str, default='my_pc', help='Имя хоста')
+    serve_parser.set_defaults(func=serve)
+
+    load_parser = subparsers.add_parser('load-test', help='Нагрузочный тест на локальном сервере')
+    load_parser.add_argument('--sessions', type=int, default=100, help='Число одновременных сессий')
+    load_parser.add_argument('--commands', type=int, default=20, help='Команд на сессию')
+    load_parser.set_defaults(func=load_test)
+
+    args = parser.parse_args()
+    # Команды эмулятора дублируют вывод через print; сервер отвечает только клиентам
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(args.func(args))
@@ -1,7 +1,15 @@
+import asyncio
 import unittest
-from emul import Emulator  # Предполагается, что ваш код в файле emulator.py
+from emul import Emulator, SessionLogger, run_batch  # Предполагается, что ваш код в файле emulator.py
+import io
 import os
+import tempfile
+import threading
 import zipfile
+from collections import deque
+from unittest import mock
+
+import emul
 
 def create_test_zip(zip_path, files_and_dirs):
     with zipfile.ZipFile(zip_path, 'w') as zipf:
@@ -32,10 +40,13 @@ class TestEmulator(unittest.TestCase):
         self.emulator = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
     
     def tearDown(self):
+        self.emulator.logger.close()
         if os.path.exists(self.zip_path):
             os.remove(self.zip_path)
         if os.path.exists(self.log_path):
             os.remove(self.log_path)
+        if os.path.exists(self.zip_path + '.idx'):
+            os.remove(self.zip_path + '.idx')
     
     # Тесты для ls
     def test_ls_current_directory(self):
@@ -86,6 +97,253 @@ class TestEmulator(unittest.TestCase):
         expected_output = 'Error: directory not found.'
         self.assertEqual(output, expected_output)
     
+    def test_rmdir_updates_parent_listing(self):
+        self.emulator.directories.add('/folder2/empty')
+        self.emulator.rmdir('/folder2/empty')
+        self.assertEqual(self.emulator.ls('folder2'), 'file3.txt')
+
+    # Тесты для отложенной перезаписи архива
+    def test_rmdir_defers_archive_rewrite_until_sync(self):
+        with zipfile.ZipFile(self.zip_path, 'a', zipfile.ZIP_DEFLATED) as zipf:
+            zipf.writestr('empty/', '')
+            zipf.writestr('folder2/packed.txt', 'packed ' * 100)
+        emulator = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+        emulator.rmdir('empty')
+        with zipfile.ZipFile(self.zip_path) as zipf:
+            self.assertIn('empty/', zipf.namelist())
+
+        self.assertEqual(emulator.sync(), '')
+        with zipfile.ZipFile(self.zip_path) as zipf:
+            self.assertNotIn('empty/', zipf.namelist())
+            self.assertIsNone(zipf.testzip())
+            self.assertEqual(zipf.read('folder2/packed.txt'), b'packed ' * 100)
+            self.assertEqual(zipf.getinfo('folder2/packed.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertNotIn('/empty', emulator.directories)
+        self.assertIn('/folder2/packed.txt', emulator.files)
+
+    def test_sync_keeps_streamed_zip64_members(self):
+        class Unseekable:
+            # Поток без seek/tell: zipfile пишет размеры в дескрипторы данных
+            def __init__(self, f):
+                self.write, self.flush = f.write, f.flush
+
+        with open(self.zip_path, 'wb') as f:
+            with zipfile.ZipFile(Unseekable(f), 'w', zipfile.ZIP_DEFLATED) as zipf:
+                with zipf.open('folder/small.txt', 'w', force_zip64=True) as member:
+                    member.write(b'small ' * 10)
+                zipf.writestr('empty/', '')
+                zipf.writestr('folder/after.txt', 'after')
+        with zipfile.ZipFile(self.zip_path) as zipf:
+            span = zipf.getinfo('empty/').header_offset  # Запись small.txt вместе с дескриптором
+        with open(self.zip_path, 'rb') as f:
+            record = f.read(span)
+        emulator = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+        emulator.rmdir('empty')
+        self.assertEqual(emulator.sync(), '')
+        with open(self.zip_path, 'rb') as f:
+            self.assertEqual(f.read(span), record)
+        with zipfile.ZipFile(self.zip_path) as zipf:
+            self.assertNotIn('empty/', zipf.namelist())
+            self.assertEqual(zipf.getinfo('folder/after.txt').header_offset, span)
+            self.assertIsNone(zipf.testzip())
+            self.assertEqual(zipf.read('folder/small.txt'), b'small ' * 10)
+            self.assertEqual(zipf.read('folder/after.txt'), b'after')
+
+    # Тесты для кэша путей
+    def test_path_cache_counts_repeated_lookups(self):
+        self.emulator.ls('folder1')
+        before = Emulator.path_cache_info()
+        self.emulator.ls('folder1')
+        after = Emulator.path_cache_info()
+        self.assertEqual(after.hits, before.hits + 1)
+        self.assertEqual(after.misses, before.misses)
+
+    def test_path_cache_after_rmdir(self):
+        self.emulator.directories.add('/folder2/tmp')
+        self.assertEqual(self.emulator.cd('folder2/tmp'), '')
+        self.emulator.cd('/')
+        self.emulator.rmdir('folder2/tmp')
+        self.assertEqual(self.emulator.cd('folder2/tmp'), 'Error: directory not found.')
+
+    # Тесты для дерева директорий
+    def test_directories_and_files_views(self):
+        self.assertIn('/', self.emulator.directories)
+        self.assertIn('/folder1/subfolder1', self.emulator.directories)
+        self.assertNotIn('/file4.txt', self.emulator.directories)
+        self.assertIn('/folder1/subfolder1/file2.txt', self.emulator.files)
+        self.assertEqual(set(self.emulator.files), {
+            '/folder1/file1.txt', '/folder1/subfolder1/file2.txt', '/folder2/file3.txt', '/file4.txt'
+        })
+
+    def test_implicit_parent_directories(self):
+        create_test_zip(self.zip_path, ['a/b/c/deep.txt'])
+        emulator = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+        self.assertEqual(emulator.ls('/a/b'), 'c')
+        self.assertEqual(emulator.cd('a/b/c'), '')
+        self.assertEqual(emulator.ls(), 'deep.txt')
+
+    def test_file_system_lists_archive_entries(self):
+        self.assertEqual(set(self.emulator.file_system), {
+            '/folder1/', '/folder1/file1.txt', '/folder1/subfolder1/', '/folder1/subfolder1/file2.txt',
+            '/folder2/', '/folder2/file3.txt', '/file4.txt'
+        })
+
+    # Тесты для ленивой загрузки
+    def test_lazy_load_matches_eager(self):
+        lazy = Emulator(self.username, self.hostname, self.zip_path, self.log_path, lazy=True)
+        self.assertEqual(lazy.ls(), self.emulator.ls())
+        self.assertEqual(lazy.ls('folder1/subfolder1'), 'file2.txt')
+        self.assertEqual(set(lazy.directories), set(self.emulator.directories))
+        self.assertEqual(set(lazy.files), set(self.emulator.files))
+
+    def test_lazy_load_expands_only_visited_directories(self):
+        os.remove(self.zip_path + '.idx')
+        with mock.patch.object(emul._TreeIndex, 'build', side_effect=AssertionError), \
+                mock.patch.object(emul._TreeIndex, 'load', side_effect=AssertionError):
+            lazy = Emulator(self.username, self.hostname, self.zip_path, self.log_path, lazy=True)
+        self.assertIsNone(lazy._tree_index)
+        self.assertFalse(os.path.exists(self.zip_path + '.idx'))
+        lazy.cd('folder1')
+        self.assertIsNotNone(lazy.root.dirs['folder2']._pending)
+        self.assertIsNotNone(lazy.root.dirs['folder1'].dirs['subfolder1']._pending)
+
+    # Тесты для индекса-спутника
+    def test_sidecar_index_matches_full_load(self):
+        self.assertTrue(os.path.exists(self.zip_path + '.idx'))
+        for options in ({'index_sidecar': False}, {'index_sidecar': False, 'lazy': True}):
+            plain = Emulator(self.username, self.hostname, self.zip_path, self.log_path, **options)
+            self.assertEqual(set(plain.directories), set(self.emulator.directories))
+            self.assertEqual(set(plain.files), set(self.emulator.files))
+        restarted = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+        self.assertEqual(restarted.ls('folder1'), 'file1.txt\nsubfolder1')
+        self.assertEqual(list(restarted.cat('/folder1/subfolder1/file2.txt')), ['test content'])
+
+    def test_stale_sidecar_index_is_rebuilt(self):
+        with zipfile.ZipFile(self.zip_path, 'a') as zipf:
+            zipf.writestr('folder2/new.txt', 'new')
+        emulator = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+        self.assertEqual(emulator.ls('folder2'), 'file3.txt\nnew.txt')
+
+        with open(self.zip_path + '.idx', 'r+b') as index_file:
+            index_file.truncate(64)
+        emulator = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+        self.assertEqual(emulator.ls('folder2'), 'file3.txt\nnew.txt')
+        self.assertGreater(os.path.getsize(self.zip_path + '.idx'), 64)
+
+    def test_sidecar_index_follows_sync(self):
+        create_test_zip(self.zip_path, ['a/', 'a/empty/', 'a/keep.txt'])
+        emulator = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+        emulator.rmdir('/a/empty')
+        emulator.sync()
+        restarted = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+        self.assertEqual(restarted.ls('a'), 'keep.txt')
+
+    # Тесты для рекурсивных команд
+    def test_find_filters_by_name_and_type(self):
+        self.assertEqual(list(self.emulator.find('/', '-name', '*.txt', '-type', 'f')), [
+            '/file4.txt', '/folder1/file1.txt', '/folder1/subfolder1/file2.txt', '/folder2/file3.txt'
+        ])
+        self.assertEqual(list(self.emulator.find('folder1', '-type', 'd')), ['/folder1', '/folder1/subfolder1'])
+        self.assertEqual(self.emulator.find('nonexistent'), 'Error: directory not found.')
+
+    def test_du_uses_archive_sizes(self):
+        self.assertEqual(list(self.emulator.du('folder1')), ['12\t/folder1/subfolder1', '24\t/folder1'])
+        self.assertEqual(list(self.emulator.du('-s')), ['48\t/'])
+
+    def test_tree_draws_subtree(self):
+        self.assertEqual('\n'.join(self.emulator.tree('folder1')), '\n'.join([
+            '/folder1',
+            '├── file1.txt',
+            '└── subfolder1',
+            '    └── file2.txt',
+            '',
+            '1 directories, 2 files',
+        ]))
+
+    def test_streaming_output_in_batch_mode(self):
+        out = io.StringIO()
+        run_batch(self.emulator, io.StringIO('find folder2\n'), out)
+        self.assertEqual(out.getvalue(), 'test_user@test_pc:/$ find folder2\n/folder2\n/folder2/file3.txt\n')
+
+    # Тесты для чтения файлов
+    def add_text_files(self):
+        lines = ''.join(f"line {i}\n" for i in range(1, 101))
+        with zipfile.ZipFile(self.zip_path, 'a') as zipf:
+            zipf.writestr('logs/stored.log', lines, compress_type=zipfile.ZIP_STORED)
+            zipf.writestr('logs/packed.log', lines, compress_type=zipfile.ZIP_DEFLATED)
+            zipf.writestr('logs/no_newline.log', 'first\nlast', compress_type=zipfile.ZIP_STORED)
+        return Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+
+    def test_cat_streams_file_content(self):
+        emulator = self.add_text_files()
+        self.assertEqual(list(emulator.cat('folder1/file1.txt')), ['test content'])
+        for name in ('stored', 'packed'):
+            self.assertEqual(list(emulator.cat(f'/logs/{name}.log')), [f"line {i}" for i in range(1, 101)])
+        self.assertEqual(emulator.cat('folder1'), "Error: 'folder1' is a directory.")
+        self.assertEqual(emulator.cat('missing.txt'), 'Error: file not found.')
+
+    def test_cat_splits_line_without_newline(self):
+        content = 'x' * (3 * emul.READ_CHUNK + 10)
+        with zipfile.ZipFile(self.zip_path, 'a') as zipf:
+            zipf.writestr('blob.bin', content, zipfile.ZIP_STORED)
+            zipf.writestr('blob.gz', content + '\ny', zipfile.ZIP_DEFLATED)
+        emulator = Emulator(self.username, self.hostname, self.zip_path, self.log_path)
+        with mock.patch.object(emul, 'MAX_LINE', emul.READ_CHUNK):
+            lines = list(emulator.cat('blob.bin'))
+            self.assertEqual(''.join(lines), content)
+            self.assertEqual([len(line) for line in lines], [emul.READ_CHUNK] * 3 + [10])
+            self.assertEqual(list(emulator.tail('-n', '2', 'blob.gz')), ['x' * 10, 'y'])
+
+    def test_head_and_tail(self):
+        emulator = self.add_text_files()
+        for name in ('stored', 'packed'):
+            self.assertEqual(list(emulator.head('-n', '2', f'logs/{name}.log')), ['line 1', 'line 2'])
+            self.assertEqual(list(emulator.tail('-n', '3', f'logs/{name}.log')), ['line 98', 'line 99', 'line 100'])
+        self.assertEqual(len(list(emulator.head('logs/packed.log'))), 10)
+        self.assertEqual(list(emulator.tail('-n', '5', 'logs/no_newline.log')), ['first', 'last'])
+        self.assertEqual(emulator.tail('-n', 'x', 'logs/stored.log'), "Error: tail: invalid number of lines: 'x'")
+
+    def test_tail_of_stored_file_does_not_decompress(self):
+        emulator = self.add_text_files()
+        emulator._get_reader = None  # Любое обращение к ZipFile.open завершится ошибкой
+        self.assertEqual(list(emulator.tail('-n', '1', 'logs/stored.log')), ['line 100'])
+
+    # Тесты для общих сессий
+    def test_shared_sessions_keep_deletions_private(self):
+        self.emulator.directories.add('/folder2/tmp')
+        first = Emulator('a', 'h', self.zip_path, self.log_path, shared_with=self.emulator)
+        second = Emulator('b', 'h', self.zip_path, self.log_path, shared_with=self.emulator)
+        self.assertIs(first.root, self.emulator.root)
+
+        self.assertEqual(first.rmdir('/folder2/tmp'), "Directory '/folder2/tmp' has been removed.")
+        first.cd('folder1')
+        self.assertEqual(first.ls('/folder2'), 'file3.txt')
+        self.assertEqual(second.ls('/folder2'), 'file3.txt\ntmp')
+        self.assertEqual(second.current_directory, '/')
+        self.assertEqual(first.sync(), 'Error: sync is not available in a shared session.')
+        self.assertEqual(self.emulator._tombstones, [])
+
+    def test_server_session(self):
+        from emul_server import EmulatorServer
+
+        async def scenario():
+            server = EmulatorServer(self.zip_path, self.log_path)
+            listener = await server.start('127.0.0.1', 0)
+            reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+            transcript = await reader.readuntil(b'$ ')
+            for command in (b'cd folder1\n', b'ls\n', b'exit\n'):
+                writer.write(command)
+            transcript += await reader.read()
+            writer.close()
+            listener.close()
+            await listener.wait_closed()
+            server.logger.close()
+            return transcript.decode()
+
+        self.assertEqual(asyncio.run(scenario()),
+                         'user1@my_pc:/$ user1@my_pc:/folder1$ file1.txt\nsubfolder1\n'
+                         'user1@my_pc:/folder1$ Exiting emulator...\n')
+
     # Тесты для uname
     def test_uname_no_args(self):
         output = self.emulator.uname()
@@ -113,5 +371,159 @@ class TestEmulator(unittest.TestCase):
         # Восстанавливаем оригинальный метод
         self.emulator.exit_emulator = original_exit
 
+    # Тест для лога команд
+    def test_log_records_prompt_and_output(self):
+        self.emulator._log('cd folder1', '')
+        self.emulator.cd('folder1')
+        self.emulator._log('ls', self.emulator.ls())
+        self.emulator.logger.flush()
+        with open(self.log_path) as log_file:
+            self.assertEqual(log_file.read(),
+                             'test_user@test_pc:/$ cd folder1\n'
+                             'test_user@test_pc:/folder1$ ls\nfile1.txt\nsubfolder1\n')
+
+
+    # Тесты для диспетчера команд
+    def test_dispatch_matches_whole_command_name(self):
+        self.assertEqual(self.emulator.execute_command('lsblk'), 'Unknown command.')
+        self.assertEqual(self.emulator.execute_command('  ls   folder2 '), 'file3.txt')
+
+    def test_dispatch_checks_arity(self):
+        self.assertEqual(self.emulator.execute_command('uname -s -n'), 'Error: uname: wrong number of arguments.')
+        self.assertEqual(self.emulator.execute_command('rmdir'), 'Error: rmdir command requires an argument.')
+
+    def test_dispatch_cd_without_argument_goes_to_root(self):
+        self.emulator.execute_command('cd folder1')
+        self.assertEqual(self.emulator.execute_command('cd'), '')
+        self.assertEqual(self.emulator.current_directory, '/')
+
+    # Тест для пакетного режима
+    def test_run_batch_writes_transcript_and_log(self):
+        out = io.StringIO()
+        latencies = run_batch(self.emulator, io.StringIO('cd folder2\n\nls\nexit\nls\n'), out)
+        self.assertEqual(len(latencies), 3)
+        expected = ('test_user@test_pc:/$ cd folder2\n'
+                    'test_user@test_pc:/folder2$ ls\nfile3.txt\n'
+                    'test_user@test_pc:/folder2$ exit\nExiting emulator...\n')
+        self.assertEqual(out.getvalue(), expected)
+        self.emulator.logger.flush()
+        with open(self.log_path) as log_file:
+            self.assertEqual(log_file.read(), expected)
+
+    # Тесты для окна (виджеты Tk заменены заглушками, дисплей не нужен)
+    def make_stub_gui(self, max_lines, trim_chunk):
+        class StubText:
+            def __init__(self):
+                self.text = ''
+                self.redraws = 0
+
+            def index(self, index):
+                # Как в Tk: после содержимого всегда есть ещё один перевод строки
+                assert index == 'end-1c'
+                lines = self.text.split('\n')
+                return f"{len(lines)}.{len(lines[-1])}"
+
+            def insert(self, index, text):
+                self.text += text
+                self.redraws += 1
+
+            def delete(self, first, last):
+                self.text = self.text.split('\n', int(last.split('.')[0]) - 1)[-1]
+
+            def config(self, *args, **options):
+                pass
+
+            yview = config
+
+        gui = object.__new__(emul.EmulatorGUI)
+        gui.emulator = self.emulator
+        gui.max_lines, gui.trim_chunk = max_lines, trim_chunk
+        gui._pending_output = deque(maxlen=max_lines)
+        gui._redraw_scheduled = False
+        gui.idle = []
+        gui.window = mock.Mock(after_idle=gui.idle.append)
+        gui.host_display = mock.Mock()
+        gui.output_text = StubText()
+        gui.command_entry = mock.Mock(get=lambda: 'ls folder2')
+        return gui
+
+    def test_gui_redraws_once_per_idle_and_trims_in_chunks(self):
+        gui = self.make_stub_gui(max_lines=6, trim_chunk=2)
+        for _ in range(3):
+            gui.run_command(None)
+        self.assertEqual(len(gui.idle), 1)
+        self.assertEqual(gui.output_text.text, '')
+        gui.idle.pop()()
+        self.assertEqual(gui.output_text.redraws, 1)
+        # Ровно max_lines строк ещё не обрезаются
+        self.assertEqual(gui.output_text.text, 'test_user@test_pc:/$ ls folder2\nfile3.txt\n' * 3)
+
+        gui.run_command(None)
+        gui.idle.pop()()
+        # 8 строк > 6: удаляется сразу столько, чтобы осталось max_lines - trim_chunk
+        self.assertEqual(gui.output_text.text, 'test_user@test_pc:/$ ls folder2\nfile3.txt\n' * 2)
+
+
+class TestSessionLogger(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.tmp.name, 'session.log')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_log(self):
+        with open(self.log_path) as log_file:
+            return log_file.read()
+
+    def test_close_flushes_queued_records_in_order(self):
+        logger = SessionLogger(self.log_path, flush_bytes=1 << 20, flush_interval=60)
+        for i in range(1000):
+            logger.write(f"{i}\n")
+        logger.close()
+        self.assertEqual(self.read_log(), ''.join(f"{i}\n" for i in range(1000)))
+
+    def test_flush_by_time(self):
+        logger = SessionLogger(self.log_path, flush_bytes=1 << 20, flush_interval=0.01)
+        logger.write("record\n")
+        for _ in range(200):
+            if os.path.exists(self.log_path) and self.read_log():
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(self.read_log(), "record\n")
+        logger.close()
+
+    def test_fsync_every_n_records(self):
+        logger = SessionLogger(self.log_path, flush_bytes=1, fsync_every=2)
+        for i in range(4):
+            logger.write(f"{i}\n")
+            logger.flush()
+        logger.close()
+        self.assertEqual(logger.fsync_count, 2)
+
+    def test_unopenable_log_path_raises_in_caller(self):
+        logger = SessionLogger(os.path.join(self.tmp.name, 'missing', 'session.log'))
+        with self.assertRaises(FileNotFoundError):
+            logger.write("record\n")
+        logger.flush()
+        logger.close()
+
+    @unittest.skipUnless(os.path.exists('/dev/full'), 'нужен /dev/full')
+    def test_write_error_is_raised_instead_of_hanging(self):
+        logger = SessionLogger('/dev/full', flush_bytes=1)
+        logger.write("record\n")
+        with self.assertRaises(OSError):
+            logger.flush()
+        with self.assertRaises(OSError):
+            logger.write("record\n")
+        with self.assertRaises(OSError):
+            logger.close()
+        self.assertIsNone(logger._thread)
+
+    def test_close_without_writes_creates_nothing(self):
+        SessionLogger(self.log_path).close()
+        self.assertFalse(os.path.exists(self.log_path))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for git_dependency_visualizer.py on synthetic repositories.
+
+Usage:
+    ./bench_visualizer.py build --commits 100 1000 --files 1000
+    ./bench_visualizer.py memory --commits 1000 --files 1000
+    ./bench_visualizer.py jobs --commits 5000 --jobs 1 2 4 8
+    ./bench_visualizer.py plantuml --commits 100 1000 --files 1000
+    ./bench_visualizer.py backend --commits 100 1000 --files 1000
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import git_dependency_visualizer as viz
+
+def make_repo(repo_path, commits, files, width=10):
+    """
+    Creates a repository with the given number of linear commits on branch main.
+    The first commit adds `files` files spread over `width` x `width` folders,
+    every next commit changes one of them.
+    """
+    subprocess.run(['git', 'init', '-q', repo_path], check=True)
+    paths = [f"d{i % width}/d{i // width % width}/f{i}.txt" for i in range(files)]
+    chunks = []
+    for k in range(commits):
+        message = f"commit {k}".encode()
+        chunks.append(b'commit refs/heads/main\n')
+        chunks.append(f"mark :{k + 1}\n".encode())
+        chunks.append(f"committer Bench <bench@example.com> {1700000000 + k * 60} +0000\n".encode())
+        chunks.append(f"data {len(message)}\n".encode() + message + b'\n')
+        if k:
+            chunks.append(f"from :{k}\n".encode())
+        changed = paths if k == 0 else [paths[k * 7919 % files]]
+        for path in changed:
+            content = f"{path} version {k}\n".encode()
+            chunks.append(f"M 100644 inline {path}\n".encode())
+            chunks.append(f"data {len(content)}\n".encode() + content + b'\n')
+    subprocess.run(['git', '-C', repo_path, 'fast-import', '--quiet'], input=b''.join(chunks), check=True)
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def _build_per_commit(repo_path):
+    """
+    The previous build: two git processes per commit.
+    """
+    graph = {}
+    for commit in viz.get_commits(repo_path):
+        graph[commit] = {
+            'parents': viz.get_parents(repo_path, commit),
+            'files_folders': viz.get_files_and_folders(repo_path, commit)
+        }
+    return graph
+
+def _build_sets(repo_path):
+    """
+    The previous build result: a plain dict with a set of paths for every commit.
+    """
+    topology = viz.get_commit_parents(repo_path)
+    graph = {}
+    with viz.GitObjectReader(repo_path) as reader:
+        tree_cache = viz.TreeListingCache(reader)
+        for (commit, parents), tree in zip(topology.items(), reader.commit_trees(list(topology))):
+            graph[commit] = {'parents': parents, 'files_folders': set(tree_cache.list(tree))}
+    return graph
+
+def bench_build(args):
+    """
+    Graph build time: a process per query against one rev-list pass and a cat-file pipe,
+    with and without the tree listing cache.
+    """
+    print(f"{'commits':>8} {'per-commit, s':>14} {'no cache, s':>12} {'cached, s':>10} {'speedup':>8} "
+          f"{'hit rate':>9}")
+    for commits in args.commits:
+        with tempfile.TemporaryDirectory() as tmp:
+            make_repo(tmp, commits, args.files)
+            per_commit, expected = _timed(lambda: _build_per_commit(tmp))
+            uncached, graph = _timed(lambda: viz.build_dependency_graph(tmp, tree_cache_size=0))
+            assert graph == expected
+            stats = {}
+            cached, graph = _timed(lambda: viz.build_dependency_graph(tmp, stats=stats))
+            assert graph == expected
+            hit_rate = stats['hits'] / (stats['hits'] + stats['misses'])
+            print(f"{commits:>8} {per_commit:>14.3f} {uncached:>12.3f} {cached:>10.3f} "
+                  f"{per_commit / cached:>7.1f}x {hit_rate:>9.1%}")
+
+def _traced(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+def bench_memory(args):
+    """
+    Memory held by the built graph: a set of paths per commit against delta-encoded path IDs.
+    """
+    print(f"{'commits':>8} {'sets, MiB':>10} {'deltas, MiB':>12} {'ratio':>7} {'read all, s':>12}")
+    for commits in args.commits:
+        with tempfile.TemporaryDirectory() as tmp:
+            make_repo(tmp, commits, args.files)
+            full, expected = _traced(lambda: _build_sets(tmp))
+            deltas, graph = _traced(lambda: viz.build_dependency_graph(tmp))
+            elapsed, _ = _timed(lambda: [graph.files_folders(commit) for commit in graph])
+            assert graph == expected
+            print(f"{commits:>8} {full / 2 ** 20:>10.1f} {deltas / 2 ** 20:>12.1f} "
+                  f"{full / deltas:>6.1f}x {elapsed:>12.3f}")
+
+def bench_jobs(args):
+    """
+    Graph build time with a growing number of worker processes.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        make_repo(tmp, args.commits, args.files)
+        print(f"{args.commits} commits, {args.files} files, {os.cpu_count()} CPUs")
+        print(f"{'jobs':>5} {'time, s':>8} {'speedup':>8}")
+        serial = None
+        for jobs in args.jobs:
+            elapsed, graph = _timed(lambda: viz.build_dependency_graph(tmp, jobs=jobs))
+            if serial is None:
+                serial, expected = elapsed, graph
+            assert list(graph) == list(expected) and graph.paths == expected.paths and graph == expected
+            print(f"{jobs:>5} {elapsed:>8.3f} {serial / elapsed:>7.1f}x")
+
+def _plantuml_string(graph):
+    """
+    The previous generate_plantuml: a list of all lines joined into one string.
+    """
+    uml = [
+        '@startuml',
+        'digraph G {',
+        'node [shape=box];',
+        'skinparam dpi 150',
+        'skinparam defaultFontSize 12',
+    ]
+    for commit, data in graph.items():
+        label = f"Commit: {commit[:7]}\\nFiles/Folders:\\n" + "\\n".join(sorted(data['files_folders']))
+        label = label.replace('"', '\\"')
+        uml.append(f'"{commit}" [label="{label}"];')
+        for parent in data['parents']:
+            if parent in graph:
+                uml.append(f'"{parent}" -> "{commit}";')
+    uml.append('}')
+    uml.append('@enduml')
+    return '\n'.join(uml)
+
+def _write_string(graph, path):
+    with open(path, 'w') as f:
+        f.write(_plantuml_string(graph))
+
+def _write_stream(graph, path):
+    with open(path, 'w') as f:
+        viz.write_plantuml(graph, f)
+
+def _peak(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_plantuml(args):
+    """
+    Peak memory of writing the PlantUML file: one joined string against the streaming writer.
+    """
+    print(f"{'commits':>8} {'output, MiB':>12} {'string peak, MiB':>17} {'stream peak, MiB':>17}")
+    for commits in args.commits:
+        with tempfile.TemporaryDirectory() as tmp:
+            make_repo(tmp, commits, args.files)
+            graph = viz.build_dependency_graph(tmp)
+            old, new = os.path.join(tmp, 'old.uml'), os.path.join(tmp, 'new.uml')
+            string_peak = _peak(lambda: _write_string(graph, old))
+            stream_peak = _peak(lambda: _write_stream(graph, new))
+            with open(old, 'rb') as f_old, open(new, 'rb') as f_new:
+                assert f_old.read() == f_new.read()
+            print(f"{commits:>8} {os.path.getsize(new) / 2 ** 20:>12.1f} {string_peak / 2 ** 20:>17.1f} "
+                  f"{stream_peak / 2 ** 20:>17.1f}")
+
+def bench_backend(args):
+    """
+    The subprocess backend against the native object reader: a full graph build,
+    and single get_parents/get_files_and_folders queries where a process is spawned per call.
+    """
+    print(f"{'commits':>8} {'build git, s':>13} {'build native, s':>16} {'query git, ms':>14} "
+          f"{'query native, ms':>17}")
+    for commits in args.commits:
+        with tempfile.TemporaryDirectory() as tmp:
+            make_repo(tmp, commits, args.files)
+            git_build, expected = _timed(lambda: viz.build_dependency_graph(tmp))
+            native_build, graph = _timed(lambda: viz.build_dependency_graph(tmp, backend='native'))
+            assert graph == expected
+            sample = list(expected)[::max(1, commits // args.queries)][:args.queries]
+            times = {}
+            for backend in viz.BACKENDS:
+                times[backend], _ = _timed(lambda: [(viz.get_parents(tmp, commit, backend),
+                                                     viz.get_files_and_folders(tmp, commit, backend=backend))
+                                                    for commit in sample])
+            print(f"{commits:>8} {git_build:>13.3f} {native_build:>16.3f} "
+                  f"{times['git'] / len(sample) * 1000:>14.2f} {times['native'] / len(sample) * 1000:>17.2f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Git dependency visualizer benchmarks')
+    parser.add_argument('--files', type=int, default=1000, help='Files in the synthetic repository')
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    build = subparsers.add_parser('build', help='Time build_dependency_graph')
+    build.add_argument('--commits', type=int, nargs='+', default=[100, 1000])
+    build.set_defaults(func=bench_build)
+
+    memory = subparsers.add_parser('memory', help='Compare memory held by the built graph')
+    memory.add_argument('--commits', type=int, nargs='+', default=[100, 1000])
+    memory.set_defaults(func=bench_memory)
+
+    jobs = subparsers.add_parser('jobs', help='Time build_dependency_graph with worker processes')
+    jobs.add_argument('--commits', type=int, default=5000)
+    jobs.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8])
+    jobs.set_defaults(func=bench_jobs)
+
+    plantuml = subparsers.add_parser('plantuml', help='Compare peak memory of writing the PlantUML code')
+    plantuml.add_argument('--commits', type=int, nargs='+', default=[100, 1000])
+    plantuml.set_defaults(func=bench_plantuml)
+
+    backend = subparsers.add_parser('backend', help='Compare the git and native backends')
+    backend.add_argument('--commits', type=int, nargs='+', default=[100, 1000])
+    backend.add_argument('--queries', type=int, default=20, help='Commits queried one by one')
+    backend.set_defaults(func=bench_backend)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -1,24 +1,120 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
+import cProfile
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import mmap
+import struct
 import subprocess
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 import sys
 import os
 import tempfile
 import unittest
+try:
+    import resource
+except ImportError:  # Not available on Windows, peak RSS is not reported there
+    resource = None
 
-def parse_args():
+def parse_args(default_formats=('svg',)):
     parser = argparse.ArgumentParser(description='Git Dependency Graph Visualizer')
     parser.add_argument('viz_tool', help='Path to graph visualization program')
     parser.add_argument('repo_path', help='Path to the git repository to analyze')
     parser.add_argument('--max-commits', type=int, help='Maximum number of commits to display')
     parser.add_argument('--since', help='Show commits more recent than a specific date')
     parser.add_argument('--until', help='Show commits older than a specific date')
+    parser.add_argument('--tree-cache-size', type=int, default=1000000,
+                        help='Maximum number of paths kept in the cache of tree listings')
+    parser.add_argument('--cache-stats', action='store_true', help='Print tree cache hit/miss statistics')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes reading trees')
+    parser.add_argument('--graph-cache', metavar='DIR',
+                        help='Directory of per-repository graph caches; only new commits are read on later runs')
+    parser.add_argument('--formats', nargs='+', choices=OUTPUT_FORMATS, default=list(default_formats),
+                        help='Output formats, rendered concurrently from one build')
+    parser.add_argument('--output-dir', default='.', help='Directory for the output files')
+    parser.add_argument('--output-name', default='dependency_graph', help='Output file name without extension')
+    parser.add_argument('--detail', choices=DETAIL_LEVELS, default='full',
+                        help='full: every commit with its files; delta: linear runs of commits collapsed, '
+                             'with added and removed paths; counts: collapsed runs with change counts only')
+    parser.add_argument('--max-paths', type=int, default=20, help='Paths listed per node with --detail delta')
+    parser.add_argument('--backend', choices=BACKENDS, default='git',
+                        help='git: run git processes; native: read the repository files directly')
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help='Write a JSON report of phase timings, subprocesses, bytes read from git '
+                             'and peak RSS to FILE (stderr by default)')
+    parser.add_argument('--cprofile', metavar='FILE', help='Dump cProfile statistics of the run to FILE')
     return parser.parse_args()
 
-def get_commits(repo_path, max_commits=None, since=None, until=None):
+# Ways to read the repository: git processes or NativeObjectReader
+BACKENDS = ('git', 'native')
+
+class Profile:
+    """
+    Run statistics for --profile: wall and CPU time per phase, spawned subprocesses
+    and bytes read from git. CPU time includes the children that exited during the phase.
+    """
+
+    def __init__(self):
+        self.phases = {}  # Name -> {'wall': s, 'cpu': s, 'calls': n}
+        self.subprocesses = 0
+        self.git_bytes = 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        wall, cpu = time.perf_counter(), self._cpu_time()
+        try:
+            yield
+        finally:
+            totals = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            totals['wall'] += time.perf_counter() - wall
+            totals['cpu'] += self._cpu_time() - cpu
+            totals['calls'] += 1
+
+    @staticmethod
+    def _cpu_time():
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def report(self):
+        report = {
+            'phases': {name: dict(totals, wall=round(totals['wall'], 6), cpu=round(totals['cpu'], 6))
+                       for name, totals in self.phases.items()},
+            'subprocesses': self.subprocesses,
+            'git_bytes_read': self.git_bytes,
+        }
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            scale = 1 if sys.platform == 'darwin' else 1024
+            report['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+            report['children_peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        return report
+
+PROFILE = Profile()
+
+def _run(cmd, **kwargs):
+    """
+    subprocess.run for git commands with captured text output, counted in PROFILE.
+    """
+    PROFILE.subprocesses += 1
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **kwargs)
+    PROFILE.git_bytes += len(result.stdout.encode('utf-8', 'surrogateescape'))
+    return result
+
+def get_commits(repo_path, max_commits=None, since=None, until=None, backend='git'):
     """
     Returns a list of commit hashes in the repository.
     """
+    if backend == 'native':
+        return list(get_commit_parents(repo_path, max_commits, since, until, backend=backend))
     cmd = ['git', '-C', repo_path, 'rev-list', '--all']
     if since:
         cmd.extend(['--since', since])
@@ -26,32 +122,836 @@ def get_commits(repo_path, max_commits=None, since=None, until=None):
         cmd.extend(['--until', until])
     if max_commits:
         cmd.extend(['-n', str(max_commits)])
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    result = _run(cmd)
     if result.returncode != 0:
         print(f"Error getting commits: {result.stderr}", file=sys.stderr)
         sys.exit(1)
     commits = result.stdout.strip().split('\n')
     return commits
 
-def get_parents(repo_path, commit):
+def get_commit_parents(repo_path, max_commits=None, since=None, until=None, exclude=(), backend='git'):
+    """
+    Returns an ordered dict of commit -> list of parent commits, read in a single
+    `git rev-list --parents` pass over the same commits as get_commits.
+    Commits reachable from the ones in exclude are left out; missing ones are ignored.
+    """
+    if backend == 'native':
+        with NativeObjectReader(repo_path) as reader:
+            return reader.commit_parents(max_commits, _timestamp(repo_path, '--since', since),
+                                         _timestamp(repo_path, '--until', until), exclude)
+    cmd = ['git', '-C', repo_path, 'rev-list', '--parents', '--all']
+    if exclude:
+        cmd.extend(['--ignore-missing', '--stdin'])
+    if since:
+        cmd.extend(['--since', since])
+    if until:
+        cmd.extend(['--until', until])
+    if max_commits:
+        cmd.extend(['-n', str(max_commits)])
+    result = _run(cmd, input=''.join(f"^{commit}\n" for commit in exclude))
+    if result.returncode != 0:
+        print(f"Error getting commits: {result.stderr}", file=sys.stderr)
+        sys.exit(1)
+    topology = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if parts:
+            topology[parts[0]] = parts[1:]  # The first hash is the commit itself
+    return topology
+
+def _timestamp(repo_path, option, date):
+    """
+    Converts a --since/--until date to a Unix timestamp as git understands it, or returns None.
+    """
+    if not date:
+        return None
+    # rev-parse prints the option as --max-age=<timestamp> or --min-age=<timestamp>
+    cmd = ['git', '-C', repo_path, 'rev-parse', f"{option}={date}"]
+    result = _run(cmd)
+    if result.returncode != 0:
+        print(f"Error parsing date {date}: {result.stderr}", file=sys.stderr)
+        sys.exit(1)
+    return int(result.stdout.strip().split('=', 1)[1])
+
+def open_reader(repo_path, backend='git'):
+    """
+    Returns an object reader of the given backend.
+    """
+    return NativeObjectReader(repo_path) if backend == 'native' else GitObjectReader(repo_path)
+
+def parse_tree(data):
+    """
+    Splits the content of a tree object into a list of file names
+    and a list of (name, hash) pairs for subtrees.
+    """
+    names, subtrees = [], []
+    # Each entry is "<mode> <name>\0" followed by the 20-byte binary hash
+    pos = 0
+    while pos < len(data):
+        space = data.index(b' ', pos)
+        nul = data.index(b'\0', space)
+        name = data[space + 1:nul].decode('utf-8', 'surrogateescape')
+        if data[pos:space] == b'40000':
+            subtrees.append((name, data[nul + 1:nul + 21].hex()))
+        else:
+            names.append(name)
+        pos = nul + 21
+    return names, subtrees
+
+class GitObjectReader:
+    """
+    Reads git objects through one long-lived `git cat-file --batch` process,
+    so walking many commits and trees does not spawn a process per object.
+    """
+
+    # Requests written before reading the answers; small enough to never fill the stdin pipe
+    PIPELINE_DEPTH = 256
+
+    def __init__(self, repo_path):
+        PROFILE.subprocesses += 1
+        self.process = subprocess.Popen(['git', '-C', repo_path, 'cat-file', '--batch'],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.process.stdin.close()  # git exits at the end of its input
+        self.process.wait()
+        self.process.stdout.close()
+
+    def read(self, name):
+        """
+        Returns (type, content) of the object with the given name.
+        """
+        return self.read_many([name])[0]
+
+    def read_many(self, names):
+        """
+        Returns a list of (type, content) for the given object names. Requests are pipelined
+        in groups of PIPELINE_DEPTH instead of waiting for each answer in turn.
+        """
+        objects = []
+        for start in range(0, len(names), self.PIPELINE_DEPTH):
+            group = names[start:start + self.PIPELINE_DEPTH]
+            self.process.stdin.write(''.join(name + '\n' for name in group).encode())
+            self.process.stdin.flush()
+            for name in group:
+                header = self.process.stdout.readline().split()
+                if len(header) != 3:
+                    print(f"Error reading object {name}: {b' '.join(header).decode()}", file=sys.stderr)
+                    sys.exit(1)
+                data = self.process.stdout.read(int(header[2]))
+                PROFILE.git_bytes += len(data)
+                self.process.stdout.read(1)  # Trailing newline after the content
+                objects.append((header[1].decode(), data))
+        return objects
+
+    def commit_tree(self, commit):
+        """
+        Returns the hash of the root tree of the given commit.
+        """
+        return self.commit_trees([commit])[0]
+
+    def commit_trees(self, commits):
+        """
+        Returns the root tree hashes of the given commits.
+        """
+        # The commit object starts with "tree <hash>"
+        return [data[5:data.index(b'\n')].decode() for _, data in self.read_many(commits)]
+
+    def walk_tree(self, tree):
+        """
+        Yields (folder, names of files directly in it) for every folder under the tree,
+        one depth at a time; the root folder is ''.
+        """
+        level = [(tree, '')]
+        while level:
+            # All trees of one depth are requested together
+            objects = self.read_many([tree for tree, _ in level])
+            next_level = []
+            for (_, folder), (_, data) in zip(level, objects):
+                prefix = folder + '/' if folder else ''
+                names, subtrees = parse_tree(data)
+                next_level.extend((subtree, prefix + name) for name, subtree in subtrees)
+                yield folder, names
+            level = next_level
+
+    def list_tree(self, tree):
+        """
+        Returns the paths of all files under the tree, like `git ls-tree -r --name-only`.
+        """
+        return [(folder + '/' if folder else '') + name
+                for folder, names in self.walk_tree(tree) for name in names]
+
+class NativeObjectReader(GitObjectReader):
+    """
+    Reads git objects from the repository files without running git: loose objects are inflated
+    with zlib, packed ones are found through the .idx files and read from the memory-mapped packs,
+    resolving ofs/ref deltas. Has the interface of GitObjectReader, plus refs and a commit walk.
+    """
+
+    # Object types of pack entries
+    PACK_TYPES = {1: 'commit', 2: 'tree', 3: 'blob', 4: 'tag'}
+    OFS_DELTA, REF_DELTA = 6, 7
+    # Bytes of delta bases kept after resolving chains, least recently used go first
+    BASE_CACHE_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, repo_path):
+        self.git_dir, common_dir = _find_git_dir(repo_path)
+        self.objects_dir = os.path.join(common_dir, 'objects')
+        self.common_dir = common_dir
+        self.bases = OrderedDict()  # (pack number, offset) -> (type, content)
+        self.base_bytes = 0
+        self.packs = []  # (index mmap, object count, pack mmap)
+        self._files = []
+        # This repository's objects, then those of objects/info/alternates (git clone --shared)
+        self.objects_dirs = self._alternates(self.objects_dir, []) or [self.objects_dir]
+        for objects_dir in self.objects_dirs:
+            pack_dir = os.path.join(objects_dir, 'pack')
+            for name in sorted(os.listdir(pack_dir)) if os.path.isdir(pack_dir) else ():
+                if name.endswith('.idx') and os.path.exists(os.path.join(pack_dir, name[:-4] + '.pack')):
+                    index = self._map(os.path.join(pack_dir, name))
+                    if index[:8] != b'\377tOc\0\0\0\2':
+                        print(f"Unsupported pack index {name}", file=sys.stderr)
+                        sys.exit(1)
+                    count = struct.unpack_from('>I', index, 8 + 255 * 4)[0]
+                    self.packs.append((index, count, self._map(os.path.join(pack_dir, name[:-4] + '.pack'))))
+        # Commits of a shallow clone whose parents are not there; rev-list shows them without parents
+        try:
+            with open(os.path.join(common_dir, 'shallow')) as f:
+                self.shallow = set(f.read().split())
+        except OSError:
+            self.shallow = set()
+
+    @classmethod
+    def _alternates(cls, objects_dir, found, depth=5):
+        """
+        Returns found extended with objects_dir and, recursively, the directories it borrows objects from.
+        """
+        objects_dir = os.path.normpath(objects_dir)
+        if objects_dir in found or not os.path.isdir(objects_dir):
+            return found
+        found.append(objects_dir)
+        try:
+            with open(os.path.join(objects_dir, 'info', 'alternates')) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return found
+        for line in lines:
+            if line and not line.startswith('#') and depth:
+                # Relative paths are relative to the objects directory that lists them
+                cls._alternates(os.path.join(objects_dir, line), found, depth - 1)
+        return found
+
+    def _map(self, path):
+        with open(path, 'rb') as f:
+            self._files.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return self._files[-1]
+
+    def close(self):
+        for mapped in self._files:
+            mapped.close()
+        self._files = []
+
+    def read_many(self, names):
+        objects = [self._read(name) for name in names]
+        PROFILE.git_bytes += sum(len(data) for _, data in objects)
+        return objects
+
+    def _read(self, name):
+        for number, (index, count, _) in enumerate(self.packs):
+            offset = self._find(index, count, bytes.fromhex(name))
+            if offset is not None:
+                return self._read_packed(number, offset)
+        paths = [os.path.join(objects_dir, name[:2], name[2:]) for objects_dir in self.objects_dirs]
+        try:
+            with open(next((path for path in paths if os.path.exists(path)), paths[0]), 'rb') as f:
+                data = zlib.decompress(f.read())
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"Error reading object {name}: {e}", file=sys.stderr)
+            sys.exit(1)
+        # A loose object is "<type> <size>\0<content>"
+        nul = data.index(b'\0')
+        return data[:data.index(b' ')].decode(), data[nul + 1:]
+
+    @staticmethod
+    def _find(index, count, name):
+        """
+        Returns the pack offset of the object from a version 2 index, or None.
+        """
+        first = name[0]
+        low = struct.unpack_from('>I', index, 8 + (first - 1) * 4)[0] if first else 0
+        high = struct.unpack_from('>I', index, 8 + first * 4)[0]
+        names = 8 + 256 * 4
+        while low < high:
+            middle = (low + high) // 2
+            found = index[names + middle * 20:names + middle * 20 + 20]
+            if found < name:
+                low = middle + 1
+            elif found > name:
+                high = middle
+            else:
+                # Name table, then CRC32s, then 4-byte offsets; the high bit points to 8-byte ones
+                offsets = names + count * 24
+                offset = struct.unpack_from('>I', index, offsets + middle * 4)[0]
+                if offset & 0x80000000:
+                    offset = struct.unpack_from('>Q', index, offsets + count * 4 + (offset & 0x7fffffff) * 8)[0]
+                return offset
+        return None
+
+    def _read_packed(self, number, offset):
+        # Walk down the delta chain to a full object, then apply the deltas back up
+        deltas = []  # (pack number, offset, delta data)
+        while True:
+            cached = self.bases.get((number, offset))
+            if cached is not None:
+                self.bases.move_to_end((number, offset))
+                obj_type, data = cached
+                break
+            pack = self.packs[number][2]
+            pos = offset
+            byte = pack[pos]
+            pos += 1
+            entry_type, size, shift = byte >> 4 & 7, byte & 15, 4
+            while byte & 0x80:
+                byte = pack[pos]
+                pos += 1
+                size |= (byte & 0x7f) << shift
+                shift += 7
+            if entry_type == self.OFS_DELTA:
+                byte = pack[pos]
+                pos += 1
+                distance = byte & 0x7f
+                while byte & 0x80:
+                    byte = pack[pos]
+                    pos += 1
+                    distance = (distance + 1) << 7 | byte & 0x7f
+                deltas.append((number, offset, _inflate(pack, pos, size)))
+                offset -= distance
+            elif entry_type == self.REF_DELTA:
+                base = pack[pos:pos + 20]
+                deltas.append((number, offset, _inflate(pack, pos + 20, size)))
+                for base_number, (index, count, _) in enumerate(self.packs):
+                    base_offset = self._find(index, count, base)
+                    if base_offset is not None:
+                        number, offset = base_number, base_offset
+                        break
+                else:
+                    obj_type, data = self._read(base.hex())  # Loose base
+                    break
+            else:
+                obj_type, data = self.PACK_TYPES[entry_type], _inflate(pack, pos, size)
+                if deltas:
+                    self._remember(number, offset, obj_type, data)  # Shared base of other chains
+                break
+        for number, offset, delta in reversed(deltas):
+            data = _apply_delta(data, delta)
+            self._remember(number, offset, obj_type, data)
+        return obj_type, data
+
+    def _remember(self, number, offset, obj_type, data):
+        if (number, offset) not in self.bases:
+            self.bases[number, offset] = (obj_type, data)
+            self.base_bytes += len(data)
+        while self.base_bytes > self.BASE_CACHE_BYTES:
+            self.base_bytes -= len(self.bases.popitem(last=False)[1][1])
+
+    def refs(self):
+        """
+        Returns a dict of ref name -> object for all refs and HEAD, like `git show-ref --head`.
+        """
+        packed = {}
+        packed_refs = os.path.join(self.common_dir, 'packed-refs')
+        if os.path.exists(packed_refs):
+            with open(packed_refs) as f:
+                for line in f:
+                    if line[0] not in '#^':  # Comments and peeled tags
+                        value, name = line.split()
+                        packed[name] = value
+        refs = dict(packed)
+        for folder, _, files in os.walk(os.path.join(self.common_dir, 'refs')):
+            for file in files:
+                name = os.path.relpath(os.path.join(folder, file), self.common_dir).replace(os.sep, '/')
+                value = self._resolve(name, packed)
+                if value is not None:
+                    refs[name] = value
+        head = self._resolve('HEAD', packed)
+        refs = dict(sorted(refs.items()))
+        return dict({'HEAD': head}, **refs) if head is not None else refs
+
+    def _resolve(self, name, packed, depth=5):
+        """
+        Returns the object a ref points to, following symbolic refs, or None.
+        """
+        # HEAD is per worktree, the other refs are shared
+        path = os.path.join(self.git_dir if name == 'HEAD' else self.common_dir, name)
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            return packed.get(name)  # Only in packed-refs, or does not exist
+        if value.startswith('ref: '):
+            return self._resolve(value[5:], packed, depth - 1) if depth else None
+        return value if len(value) == 40 else None
+
+    def commit_info(self, commit):
+        """
+        Returns (parents, committer timestamp) of the commit.
+        """
+        obj_type, data = self.read(commit)
+        parents, date = [], 0
+        for line in data[:data.find(b'\n\n')].split(b'\n'):
+            if line.startswith(b'parent ') and commit not in self.shallow:
+                parents.append(line[7:].decode())
+            elif line.startswith(b'committer '):
+                date = int(line.rsplit(b' ', 2)[1])
+        return parents, date
+
+    def peel(self, name):
+        """
+        Returns the commit a ref value points to through annotated tags, or None for other objects.
+        """
+        obj_type, data = self.read(name)
+        while obj_type == 'tag':
+            name = data[7:data.index(b'\n')].decode()  # "object <hash>"
+            obj_type, data = self.read(name)
+        return name if obj_type == 'commit' else None
+
+    # Commits walked past the last interesting one, against clock skew, as in git
+    SLOP = 5
+
+    def commit_parents(self, max_commits=None, since=None, until=None, exclude=()):
+        """
+        Returns an ordered dict of commit -> list of parent commits reachable from all refs,
+        newest committer date first like `git rev-list --parents --all`; since and until are
+        timestamps. Commits reachable from the ones in exclude are left out; missing ones are ignored.
+        """
+        queue = []  # (-date, sequence, commit), so that equal dates come out in insertion order
+        info = {}  # Commit -> (parents, date)
+        uninteresting = set()
+        sequence = itertools.count()
+
+        def push(commit):
+            if commit not in info:
+                info[commit] = self.commit_info(commit)
+                heapq.heappush(queue, (-info[commit][1], next(sequence), commit))
+
+        # Start points in the order rev-list adds them: refs by name, HEAD, then the excluded commits
+        refs = self.refs()
+        head = refs.pop('HEAD', None)
+        for value in [*refs.values(), head]:
+            commit = self.peel(value) if value is not None else None
+            if commit is not None:
+                push(commit)
+        for name in exclude:
+            if self._exists(name):
+                commit = self.peel(name)
+                if commit is not None:
+                    uninteresting.add(commit)
+                    push(commit)
+
+        topology = {}
+        slop = self.SLOP
+        while queue and slop:
+            _, _, commit = heapq.heappop(queue)
+            parents, date = info[commit]
+            if commit in uninteresting:
+                uninteresting.update(parents)
+            elif since is not None and date < since:
+                continue  # Older history is not walked
+            elif until is None or date <= until:
+                topology[commit] = parents
+                if max_commits and not exclude and len(topology) == max_commits:
+                    break
+            for parent in parents:
+                push(parent)
+            if exclude:
+                # Stop a few commits after only uninteresting ones are left
+                slop = slop - 1 if all(entry[2] in uninteresting for entry in queue) else self.SLOP
+        if exclude:
+            topology = {commit: parents for commit, parents in topology.items() if commit not in uninteresting}
+        if max_commits:
+            topology = dict(itertools.islice(topology.items(), max_commits))
+        return topology
+
+    def _exists(self, name):
+        try:
+            raw = bytes.fromhex(name)
+        except ValueError:
+            return False
+        return (any(self._find(index, count, raw) is not None for index, count, _ in self.packs)
+                or any(os.path.exists(os.path.join(objects_dir, name[:2], name[2:]))
+                       for objects_dir in self.objects_dirs))
+
+def _find_git_dir(repo_path):
+    """
+    Returns (git directory, common directory) of a repository, worktree or bare repository.
+    """
+    git_dir = os.path.join(repo_path, '.git')
+    if os.path.isfile(git_dir):
+        with open(git_dir) as f:
+            git_dir = os.path.join(repo_path, f.read().strip()[len('gitdir: '):])
+    elif not os.path.isdir(git_dir):
+        git_dir = repo_path  # Bare repository
+    common_dir = git_dir
+    if os.path.exists(os.path.join(git_dir, 'commondir')):
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+    if not os.path.isdir(os.path.join(common_dir, 'objects')):
+        print(f"Not a git repository: {repo_path}", file=sys.stderr)
+        sys.exit(1)
+    return git_dir, common_dir
+
+def _inflate(data, pos, size):
+    """
+    Inflates a zlib stream of a pack that starts at pos and unpacks to size bytes.
+    """
+    inflater = zlib.decompressobj()
+    chunks = []
+    chunk = max(size + 64, 4096)
+    while not inflater.eof:
+        if pos >= len(data):
+            raise zlib.error('truncated pack entry')
+        chunks.append(inflater.decompress(data[pos:pos + chunk]))
+        pos += chunk
+    return b''.join(chunks)
+
+def _apply_delta(base, delta):
+    """
+    Builds an object from its delta base and a git delta: two size varints,
+    then copy-from-base and insert instructions.
+    """
+    pos = 0
+    for _ in range(2):  # Base and result sizes
+        while delta[pos] & 0x80:
+            pos += 1
+        pos += 1
+    result = []
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            # Copy: offset and size bytes present as flagged by the low 7 bits
+            offset = size = 0
+            for bit in range(4):
+                if op & 1 << bit:
+                    offset |= delta[pos] << bit * 8
+                    pos += 1
+            for bit in range(3):
+                if op & 1 << (4 + bit):
+                    size |= delta[pos] << bit * 8
+                    pos += 1
+            result.append(base[offset:offset + (size or 0x10000)])
+        elif op:
+            result.append(delta[pos:pos + op])
+            pos += op
+        else:
+            raise ValueError('invalid delta instruction')
+    return b''.join(result)
+
+class TreeListingCache:
+    """
+    Bounded LRU cache of recursive tree listings keyed by (tree hash, folder path).
+
+    A listing is the tuple of files and folders under the folder, as in get_files_and_folders.
+    Subtrees that did not change between commits keep their hash, so they are read from git
+    and expanded once; listing a commit reads only the trees missing from the cache.
+    The cache holds at most max_paths paths in total, least recently used listings go first.
+    For diffs it also keeps up to max_trees parsed tree objects.
+    """
+
+    def __init__(self, reader, max_paths=1000000, max_trees=4096):
+        self.reader = reader
+        self.max_paths = max_paths
+        self.max_trees = max_trees
+        self.listings = OrderedDict()
+        self.trees = OrderedDict()  # Tree hash -> (file names, subtrees)
+        self.paths = 0  # Paths held by all cached listings
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'listings': len(self.listings), 'paths': self.paths}
+
+    def _lookup(self, key):
+        listing = self.listings.get(key)
+        if listing is not None:
+            self.listings.move_to_end(key)
+            self.hits += 1
+        return listing
+
+    def list(self, tree, folder=''):
+        """
+        Returns the tuple of files and folders under the tree located at the given folder.
+        """
+        listing = self._lookup((tree, folder))
+        if listing is not None:
+            return listing
+        # Read every tree that is not cached yet, one depth at a time
+        found = {}  # Cached listings of subtrees used by this call
+        parsed = {}
+        level = [(tree, folder)]
+        while level:
+            objects = self.reader.read_many([key[0] for key in level])
+            self.misses += len(level)
+            next_level = []
+            for key, (_, data) in zip(level, objects):
+                names, subtrees = parse_tree(data)
+                parsed[key] = names, subtrees
+                prefix = key[1] + '/' if key[1] else ''
+                for name, subtree in subtrees:
+                    sub_key = (subtree, prefix + name)
+                    if sub_key in found or sub_key in parsed:
+                        continue
+                    listing = self._lookup(sub_key)
+                    if listing is not None:
+                        found[sub_key] = listing
+                    else:
+                        next_level.append(sub_key)
+            level = next_level
+
+        # Build listings bottom-up: subtrees were parsed after their parents
+        for key in reversed(list(parsed)):
+            names, subtrees = parsed[key]
+            prefix = key[1] + '/' if key[1] else ''
+            paths = [prefix + name for name in names]
+            if names and key[1]:
+                paths.append(key[1])
+            for name, subtree in subtrees:
+                paths.extend(found[(subtree, prefix + name)])
+            found[key] = tuple(paths)
+            self._store(key, found[key])
+        return found[(tree, folder)]
+
+    def _parse(self, tree):
+        parsed = self.trees.get(tree)
+        if parsed is not None:
+            self.trees.move_to_end(tree)
+            self.hits += 1
+            return parsed
+        self.misses += 1
+        parsed = self.trees[tree] = parse_tree(self.reader.read(tree)[1])
+        if len(self.trees) > self.max_trees:
+            self.trees.popitem(last=False)
+        return parsed
+
+    def diff(self, old, new, folder=''):
+        """
+        Returns (added, removed) lists of paths between the listings of two trees
+        at the same folder. Subtrees with equal hashes are skipped without reading them.
+        """
+        added, removed = [], []
+        self._diff(old, new, folder, added, removed)
+        # A path that turned from a file into a folder (or back) shows up on both sides
+        both = set(added).intersection(removed) if added and removed else None
+        if both:
+            added = [path for path in added if path not in both]
+            removed = [path for path in removed if path not in both]
+        return added, removed
+
+    def _diff(self, old, new, folder, added, removed):
+        if old == new:
+            return
+        if old is None:
+            added.extend(self.list(new, folder))
+            return
+        if new is None:
+            removed.extend(self.list(old, folder))
+            return
+        old_names, old_subtrees = self._parse(old)
+        new_names, new_subtrees = self._parse(new)
+        prefix = folder + '/' if folder else ''
+        old_set, new_set = set(old_names), set(new_names)
+        added.extend(prefix + name for name in new_names if name not in old_set)
+        removed.extend(prefix + name for name in old_names if name not in new_set)
+        # A folder is listed while it directly contains files
+        if folder and bool(old_names) != bool(new_names):
+            (added if new_names else removed).append(folder)
+        old_subtrees, new_subtrees = dict(old_subtrees), dict(new_subtrees)
+        for name in old_subtrees.keys() | new_subtrees.keys():
+            self._diff(old_subtrees.get(name), new_subtrees.get(name), prefix + name, added, removed)
+
+    def _store(self, key, listing):
+        self.listings[key] = listing
+        self.paths += len(listing)
+        while self.paths > self.max_paths and len(self.listings) > 1:
+            _, evicted = self.listings.popitem(last=False)
+            self.paths -= len(evicted)
+
+class CommitGraph(Mapping):
+    """
+    Commit graph that stores each commit's files and folders as a delta against its first parent.
+
+    Paths are interned as integer IDs; a commit keeps only the arrays of added and removed
+    path IDs. Commits whose first parent is not in the graph keep their full set as the delta
+    against an empty one. graph[commit] returns {'parents': [...], 'files_folders': set(...)}
+    like the plain dict did: the set is materialized on request, starting from a recently
+    materialized neighbour when there is one.
+    """
+
+    def __init__(self, cache_size=16):
+        self.paths = []  # Path ID -> path
+        self.path_ids = {}  # Path -> path ID
+        self.cache_size = cache_size
+        self._parents = {}
+        self._base = {}  # Commit -> first parent it is stored against, or None
+        self._added = {}
+        self._removed = {}
+        self._children = {}  # Commit -> commits stored against it
+        self._materialized = OrderedDict()  # Commit -> set of path IDs, least recently used first
+
+    def _intern(self, paths):
+        if not paths:
+            return ()  # Shared by all commits without changes on this side
+        path_ids = self.path_ids
+        ids = array('I')
+        for path in paths:
+            path_id = path_ids.get(path)
+            if path_id is None:
+                path_id = path_ids[path] = len(self.paths)
+                self.paths.append(path)
+            ids.append(path_id)
+        return ids
+
+    def add(self, commit, parents, base, added, removed=()):
+        """
+        Adds a commit whose file set differs from the one of commit base by the given paths.
+        """
+        self._add_ids(commit, parents, base, self._intern(added), self._intern(removed))
+
+    def __getitem__(self, commit):
+        return {'parents': self._parents[commit], 'files_folders': self.files_folders(commit)}
+
+    def __contains__(self, commit):
+        return commit in self._parents
+
+    def __iter__(self):
+        return iter(self._parents)
+
+    def __len__(self):
+        return len(self._parents)
+
+    def parents(self, commit):
+        return self._parents[commit]
+
+    def files_folders(self, commit):
+        """
+        Returns the set of files and folders of the commit.
+        """
+        paths = self.paths
+        return {paths[path_id] for path_id in self.path_id_set(commit)}
+
+    def path_id_set(self, commit):
+        """
+        Returns the set of path IDs of the commit. The set is shared, do not modify it.
+        """
+        ids = self._materialized.get(commit)
+        if ids is not None:
+            self._materialized.move_to_end(commit)
+            return ids
+        # A materialized child gives the set back by undoing its delta
+        for child in self._children.get(commit, ()):
+            child_ids = self._materialized.get(child)
+            if child_ids is not None:
+                ids = set(child_ids)
+                ids.difference_update(self._added[child])
+                ids.update(self._removed[child])
+                return self._remember(commit, ids)
+        # Otherwise replay deltas down from the nearest materialized first-parent ancestor
+        chain = []
+        node = commit
+        while node is not None and node not in self._materialized:
+            chain.append(node)
+            node = self._base[node]
+        ids = set(self._materialized[node]) if node is not None else set()
+        for node in reversed(chain):
+            ids.difference_update(self._removed[node])
+            ids.update(self._added[node])
+        return self._remember(commit, ids)
+
+    def save(self, path, **extra):
+        """
+        Writes the graph as JSON, together with the extra fields, replacing the file atomically.
+        """
+        state = dict(extra, paths=self.paths, commits=[
+            [commit, parents, self._base[commit], list(self._added[commit]), list(self._removed[commit])]
+            for commit, parents in self._parents.items()])
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns (graph, other fields of the file) as written by save.
+        """
+        with open(path) as f:
+            state = json.load(f)
+        graph = cls()
+        graph.paths = state.pop('paths')
+        graph.path_ids = {path: path_id for path_id, path in enumerate(graph.paths)}
+        for commit, parents, base, added, removed in state.pop('commits'):
+            graph._add_ids(commit, parents, base, array('I', added) if added else (),
+                           array('I', removed) if removed else ())
+        return graph, state
+
+    def _add_ids(self, commit, parents, base, added, removed):
+        self._parents[commit] = parents
+        self._base[commit] = base
+        self._added[commit] = added
+        self._removed[commit] = removed
+        if base is not None:
+            self._children.setdefault(base, []).append(commit)
+
+    def _remember(self, commit, ids):
+        self._materialized[commit] = ids
+        if len(self._materialized) > self.cache_size:
+            self._materialized.popitem(last=False)
+        return ids
+
+def get_parents(repo_path, commit, backend='git'):
     """
     Returns a list of parent commits for the given commit.
     """
+    if backend == 'native':
+        with NativeObjectReader(repo_path) as reader:
+            return reader.commit_info(commit)[0]
     cmd = ['git', '-C', repo_path, 'rev-list', '--parents', '-n', '1', commit]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    result = _run(cmd)
     if result.returncode != 0:
         print(f"Error getting parents of commit {commit}: {result.stderr}", file=sys.stderr)
         sys.exit(1)
     parts = result.stdout.strip().split()
     return parts[1:]  # The first hash is the commit itself
 
-def get_files_and_folders(repo_path, commit):
+def get_files_and_folders(repo_path, commit, reader=None, tree_cache=None, backend='git'):
     """
     Returns a set of files and folders in the given commit.
+    With a GitObjectReader the tree is read through its pipe instead of a new git process;
+    with a TreeListingCache unchanged subtrees are taken from the cache.
     """
+    if tree_cache is not None:
+        return set(tree_cache.list(tree_cache.reader.commit_tree(commit)))
+    if reader is None and backend == 'native':
+        with NativeObjectReader(repo_path) as reader:
+            return get_files_and_folders(repo_path, commit, reader)
+    if reader is not None:
+        # Folders are known from the tree walk: the ones that directly contain files
+        files_and_folders = set()
+        for folder, names in reader.walk_tree(reader.commit_tree(commit)):
+            if names and folder:
+                files_and_folders.add(folder)
+                files_and_folders.update(folder + '/' + name for name in names)
+            else:
+                files_and_folders.update(names)
+        return files_and_folders
     # Get the tree of the commit
     cmd = ['git', '-C', repo_path, 'ls-tree', '-r', '--name-only', commit]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    result = _run(cmd)
     if result.returncode != 0:
         print(f"Error getting files for commit {commit}: {result.stderr}", file=sys.stderr)
         sys.exit(1)
@@ -59,73 +959,407 @@ def get_files_and_folders(repo_path, commit):
     folders = {os.path.dirname(file) for file in files if os.path.dirname(file)}
     return set(files).union(folders)
 
-def build_dependency_graph(repo_path, max_commits=None, since=None, until=None):
+def _tree_deltas(tree_cache, pairs):
+    """
+    Returns (added, removed) for each (base tree, tree) pair; with no base tree
+    the whole listing of the tree is added.
+    """
+    deltas = []
+    for base_tree, tree in pairs:
+        if base_tree is None:
+            deltas.append((tree_cache.list(tree), ()))
+        else:
+            deltas.append(tree_cache.diff(base_tree, tree))
+    return deltas
+
+_worker_cache = None  # TreeListingCache of a worker process
+
+def _init_worker(repo_path, tree_cache_size, backend):
+    global _worker_cache, PROFILE
+    PROFILE = Profile()  # A forked worker starts with a copy of the parent's counts
+    # The cat-file process exits on end of input when the worker process goes away
+    _worker_cache = TreeListingCache(open_reader(repo_path, backend), tree_cache_size)
+
+def _worker_deltas(pairs):
+    return (os.getpid(), _tree_deltas(_worker_cache, pairs), _worker_cache.stats(),
+            (PROFILE.subprocesses, PROFILE.git_bytes))
+
+def _parallel_deltas(repo_path, pairs, jobs, tree_cache_size, stats, backend):
+    """
+    Splits the pairs into consecutive chunks for a pool of worker processes, each with its own
+    cat-file pipe and tree cache. Results come back in submission order, so the graph is
+    assembled exactly as in a serial run.
+    """
+    chunk_size = max(64, -(-len(pairs) // (jobs * 4)))
+    chunks = [pairs[start:start + chunk_size] for start in range(0, len(pairs), chunk_size)]
+    deltas = []
+    worker_stats = {}
+    worker_counts = {}
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(repo_path, tree_cache_size, backend)) as pool:
+        for pid, chunk_deltas, chunk_stats, counts in pool.map(_worker_deltas, chunks):
+            deltas.extend(chunk_deltas)
+            # Statistics of a worker are cumulative
+            worker_stats[pid] = chunk_stats
+            worker_counts[pid] = counts
+    # The workers themselves and what they spawned and read
+    PROFILE.subprocesses += len(worker_counts) + sum(spawned for spawned, _ in worker_counts.values())
+    PROFILE.git_bytes += sum(read for _, read in worker_counts.values())
+    if stats is not None:
+        stats.update(dict.fromkeys(('hits', 'misses', 'listings', 'paths'), 0))
+        for chunk_stats in worker_stats.values():
+            for key, value in chunk_stats.items():
+                stats[key] += value
+    return deltas
+
+def build_dependency_graph(repo_path, max_commits=None, since=None, until=None, tree_cache_size=1000000,
+                           stats=None, jobs=1, backend='git'):
     """
     Builds the dependency graph of commits.
+    Uses one `git rev-list --parents` call for the topology and one `git cat-file --batch`
+    process for all trees, so the number of spawned processes does not depend on history size.
+    Tree listings are shared between commits through a TreeListingCache of tree_cache_size paths;
+    its hit/miss statistics are stored into the stats dict, if one is given.
+    Returns a CommitGraph: file sets are kept as deltas computed from tree diffs
+    against the first parent and materialized when they are read.
+    With jobs > 1 the trees are diffed by that many worker processes; the result is the same.
+    With the native backend no git process is needed (except to parse since/until dates).
     """
-    commits = get_commits(repo_path, max_commits, since, until)
-    graph = {}
-    for commit in commits:
-        parents = get_parents(repo_path, commit)
-        files_and_folders = get_files_and_folders(repo_path, commit)
-        graph[commit] = {
-            'parents': parents,
-            'files_folders': files_and_folders
-        }
+    with PROFILE.phase('commits'):
+        topology = get_commit_parents(repo_path, max_commits, since, until, backend=backend)
+    graph = CommitGraph()
+    with PROFILE.phase('trees'):
+        _add_commits(graph, repo_path, topology, tree_cache_size, stats, jobs, backend)
     return graph
 
-def generate_plantuml(graph):
+def _add_commits(graph, repo_path, topology, tree_cache_size, stats, jobs, backend, known=()):
     """
-    Generates PlantUML code for the given graph.
+    Adds the commits of the topology to the graph. First parents among the known commits
+    are used as delta bases too; the caller adds them to the graph.
+    """
+    with open_reader(repo_path, backend) as reader:
+        trees = dict(zip(topology, reader.commit_trees(list(topology))))
+        bases = [parents[0] if parents and (parents[0] in trees or parents[0] in known) else None
+                 for parents in topology.values()]
+        known = list(dict.fromkeys(base for base in bases if base is not None and base not in trees))
+        trees.update(zip(known, reader.commit_trees(known)))
+        pairs = [(trees[base] if base is not None else None, trees[commit]) for commit, base in zip(topology, bases)]
+        if jobs > 1 and len(pairs) > 1:
+            deltas = _parallel_deltas(repo_path, pairs, jobs, tree_cache_size, stats, backend)
+        else:
+            tree_cache = TreeListingCache(reader, tree_cache_size)
+            deltas = _tree_deltas(tree_cache, pairs)
+            if stats is not None:
+                stats.update(tree_cache.stats())
+    for (commit, parents), base, (added, removed) in zip(topology.items(), bases, deltas):
+        graph.add(commit, parents, base, added, removed)
+
+def get_refs(repo_path, backend='git'):
+    """
+    Returns a dict of ref name -> object for all refs and HEAD, the starting points of `rev-list --all`.
+    """
+    if backend == 'native':
+        with NativeObjectReader(repo_path) as reader:
+            return reader.refs()
+    cmd = ['git', '-C', repo_path, 'show-ref', '--head']
+    result = _run(cmd)
+    # show-ref exits with 1 when there are no refs at all
+    if result.returncode not in (0, 1):
+        print(f"Error getting refs: {result.stderr}", file=sys.stderr)
+        sys.exit(1)
+    return {name: value for value, name in (line.split(' ', 1) for line in result.stdout.splitlines())}
+
+def graph_cache_path(cache_dir, repo_path):
+    """
+    Returns the cache file of the repository in cache_dir: one file per real repository path.
+    """
+    key = hashlib.sha1(os.path.realpath(repo_path).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(cache_dir, key + '.json')
+
+GRAPH_CACHE_VERSION = 1
+
+def update_dependency_graph(repo_path, cache_dir, tree_cache_size=1000000, stats=None, jobs=1, backend='git'):
+    """
+    Same as build_dependency_graph over the whole history, but keeps the graph in a cache file
+    in cache_dir. A later run reads the trees of only the commits that are not reachable from the
+    cached refs, and orders old and new commits by one `rev-list --all` pass, as a fresh build would.
+    If some cached commit is no longer reachable (history was rewritten, a branch deleted), the cache
+    is dropped and the graph is built anew.
+    """
+    cache_file = graph_cache_path(cache_dir, repo_path)
+    with PROFILE.phase('cache'):
+        refs = get_refs(repo_path, backend)
+        cached = None
+        if os.path.exists(cache_file):
+            try:
+                cached, state = CommitGraph.load(cache_file)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Ignoring unreadable graph cache {cache_file}: {e}", file=sys.stderr)
+            else:
+                if state.get('version') != GRAPH_CACHE_VERSION or state.get('repo') != os.path.realpath(repo_path):
+                    cached = None
+    if cached is not None and state['refs'] == refs:
+        if stats is not None:
+            stats.update(dict.fromkeys(('hits', 'misses', 'listings', 'paths'), 0))
+        return cached
+    graph = CommitGraph()
+    with PROFILE.phase('commits'):
+        if cached is not None:
+            topology = get_commit_parents(repo_path, exclude=sorted(set(state['refs'].values())), backend=backend)
+            # The new commits and the cached ones make up the whole history only if every cached
+            # commit is still reachable
+            order = get_commits(repo_path, backend=backend)
+            if len(topology) + len(cached) == len(order):
+                graph.paths, graph.path_ids = cached.paths, cached.path_ids
+            else:
+                cached = None
+        if cached is None:
+            topology = get_commit_parents(repo_path, backend=backend)
+    with PROFILE.phase('trees'):
+        _add_commits(graph, repo_path, topology, tree_cache_size, stats, jobs, backend, cached or ())
+    with PROFILE.phase('cache'):
+        if cached is not None:
+            # Cached path IDs stay valid: the new graph shares the interned paths and only extends them.
+            # Commits go in rev-list order, so the output does not depend on what was cached
+            merged = CommitGraph()
+            merged.paths, merged.path_ids = graph.paths, graph.path_ids
+            for commit in order:
+                source = graph if commit in graph else cached
+                merged._add_ids(commit, source._parents[commit], source._base[commit], source._added[commit],
+                                source._removed[commit])
+            graph = merged
+        os.makedirs(cache_dir, exist_ok=True)
+        graph.save(cache_file, version=GRAPH_CACHE_VERSION, repo=os.path.realpath(repo_path), refs=refs)
+    return graph
+
+DETAIL_LEVELS = ('full', 'delta', 'counts')
+
+def summarize_graph(graph, detail='delta', max_paths=20):
+    """
+    Collapses linear runs of commits - each one the only child of the previous one, which is its
+    only parent - into one node, so the diagram has about as many nodes as the history has branch
+    and merge points. A node is keyed by the newest commit of its run, and instead of the full file
+    list its label shows the change over the run against the first parent of the run:
+    'delta' lists the added and removed paths (at most max_paths of them), 'counts' only counts them.
+    Returns a dict of node -> {'parents': [...], 'label': [lines]} for generate_plantuml.
+    """
+    if isinstance(graph, CommitGraph):
+        # Without materializing the file sets of the commits inside runs
+        parents_of, files_of = graph.parents, graph.files_folders
+    else:
+        def parents_of(commit):
+            return graph[commit]['parents']
+
+        def files_of(commit):
+            return graph[commit]['files_folders']
+    children = {}
+    for commit in graph:
+        for parent in parents_of(commit):
+            if parent in graph:
+                children[parent] = children.get(parent, 0) + 1
+    following = {}  # Commit -> the next commit of its run
+    for commit in graph:
+        parents = parents_of(commit)
+        if len(parents) == 1 and parents[0] in graph and children[parents[0]] == 1:
+            following[parents[0]] = commit
+    continued = set(following.values())
+    runs = {}  # Commit -> first commit of its run
+    members = {}  # First commit of a run -> its commits, oldest first
+    for start in graph:
+        if start in continued:
+            continue
+        run = members[start] = [start]
+        while run[-1] in following:
+            run.append(following[run[-1]])
+        runs.update(dict.fromkeys(run, start))
+
+    summary = {}
+    for commit in graph:  # Newest first, like the commits
+        run = members[runs[commit]]
+        if run[-1] != commit:
+            continue
+        start = run[0]
+        parents = parents_of(start)
+        base = parents[0] if parents and parents[0] in graph else None
+        before = files_of(base) if base is not None else set()
+        after = files_of(commit)
+        added, removed = sorted(after - before), sorted(before - after)
+        if len(run) == 1:
+            label = [f"Commit: {commit[:7]}"]
+        else:
+            label = [f"Commits: {start[:7]}..{commit[:7]} ({len(run)})"]
+        label.append(f"Files/Folders: +{len(added)} -{len(removed)}")
+        if detail == 'delta':
+            changes = [f"+ {path}" for path in added] + [f"- {path}" for path in removed]
+            label.extend(changes[:max_paths])
+            if len(changes) > max_paths:
+                label.append(f"... {len(changes) - max_paths} more")
+        # Parents of a run start always end their own runs
+        summary[commit] = {'parents': [members[runs[parent]][-1] for parent in parents if parent in graph],
+                           'label': label}
+    return summary
+
+PLANTUML_HEADER = '\n'.join([
+    '@startuml',
+    'digraph G {',
+    'node [shape=box];',
+    'skinparam dpi 150',  # Adjust DPI for better readability
+    'skinparam defaultFontSize 12',  # Adjust font size if needed
+])
+PLANTUML_FOOTER = '\n}\n@enduml'
+# The same graph as plain DOT for Graphviz, without the PlantUML wrapper and skinparams
+DOT_HEADER = 'digraph G {\nnode [shape=box];'
+DOT_FOOTER = '\n}\n'
+
+def iter_plantuml(graph):
+    """
+    Yields the PlantUML code for the given graph piece by piece, one node or edge at a time,
+    so only the label being written is held in memory. Lines are separated by newlines,
+    with none after the last one.
+    """
+    yield PLANTUML_HEADER
+    yield from _iter_elements(graph)
+    yield PLANTUML_FOOTER
+
+def _iter_elements(graph):
+    """
+    Yields the node and edge lines of the graph, each one preceded by a newline.
+    Nodes of a summarized graph bring their own label lines.
     """
-    uml = [
-        '@startuml',
-        'digraph G {',
-        'node [shape=box];',
-        'skinparam dpi 150',  # Adjust DPI for better readability
-        'skinparam defaultFontSize 12',  # Adjust font size if needed
-    ]
     for commit, data in graph.items():
-        label = f"Commit: {commit[:7]}\\nFiles/Folders:\\n" + "\\n".join(sorted(data['files_folders']))
+        if 'label' in data:
+            label = "\\n".join(data['label'])
+        else:
+            label = f"Commit: {commit[:7]}\\nFiles/Folders:\\n" + "\\n".join(sorted(data['files_folders']))
         # Escape double quotes in label
         label = label.replace('"', '\\"')
-        uml.append(f'"{commit}" [label="{label}"];')
+        yield f'\n"{commit}" [label="{label}"];'
         for parent in data['parents']:
             if parent in graph:
-                uml.append(f'"{parent}" -> "{commit}";')
-    uml.append('}')
-    uml.append('@enduml')
-    return '\n'.join(uml)
+                yield f'\n"{parent}" -> "{commit}";'
 
-def visualize_graph(plantuml_code, viz_tool):
+def write_plantuml(graph, file):
     """
-    Saves the PlantUML code to a file in the script's directory, invokes the visualization tool, and displays the graph.
+    Writes the PlantUML code for the given graph to a text file or pipe as it is generated.
     """
-    # Get the directory where the script is located
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for chunk in iter_plantuml(graph):
+        file.write(chunk)
 
-    # Define the filename for the PlantUML file and the output image
-    uml_filename = os.path.join(script_dir, 'dependency_graph.uml')
+def generate_plantuml(graph):
+    """
+    Generates PlantUML code for the given graph.
+    """
+    return ''.join(iter_plantuml(graph))
 
-    # Write the PlantUML code to the file
-    with open(uml_filename, 'w') as f:
-        f.write(plantuml_code)
+# Formats drawn by the visualization tool; the others are written directly
+RENDERED_FORMATS = ('svg', 'png')
+OUTPUT_FORMATS = RENDERED_FORMATS + ('dot', 'uml')
 
-    # Run the visualization tool to generate the SVG image
-    result = subprocess.run([viz_tool, '-tsvg', uml_filename], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if result.returncode != 0:
-        print(f"Error generating SVG image: {result.stderr}", file=sys.stderr)
-        sys.exit(1)
+class _Output:
+    """
+    One output file of visualize_graph: a rendered image written by a `viz_tool -pipe` process
+    that reads the PlantUML code from its stdin, or code written directly. The file is created
+    under a temporary name and renamed by finish, so nobody sees a partial file.
+    """
 
-    # Determine the output image filename (.svg extension)
-    image_filename = uml_filename[:-4] + '.svg'  # Replace .uml with .svg
+    def __init__(self, output_format, path, viz_tool):
+        self.format = output_format
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.process = self.stderr = None
+        self.broken = False
+        if output_format in RENDERED_FORMATS:
+            self.stderr = tempfile.TemporaryFile()
+            PROFILE.subprocesses += 1
+            try:
+                with open(self.tmp_path, 'wb') as image:
+                    self.process = subprocess.Popen([viz_tool, '-charset', 'UTF-8', '-pipe', f"-t{output_format}"],
+                                                    stdin=subprocess.PIPE, stdout=image, stderr=self.stderr)
+            except OSError as e:
+                # The renderer cannot be started: this output never reaches visualize_graph to be discarded
+                self.stderr.close()
+                if os.path.exists(self.tmp_path):
+                    os.remove(self.tmp_path)
+                print(f"Error generating {output_format.upper()} image: {e}", file=sys.stderr)
+                sys.exit(1)
+            self.stream = io.TextIOWrapper(self.process.stdin, encoding='utf-8', errors='surrogateescape')
+        else:
+            self.stream = open(self.tmp_path, 'w', encoding='utf-8', errors='surrogateescape')
+        header, self.footer = (DOT_HEADER, DOT_FOOTER) if output_format == 'dot' else (PLANTUML_HEADER,
+                                                                                         PLANTUML_FOOTER)
+        self.write(header)
 
-    # Check if the image was generated
-    if os.path.exists(image_filename):
-        print(f"SVG image generated at: {image_filename}")
-        print("You can open it in a web browser or vector graphics editor to zoom without loss of quality.")
-    else:
-        print("Failed to generate SVG image.")
+    def write(self, text):
+        if not self.broken:
+            try:
+                self.stream.write(text)
+            except BrokenPipeError:
+                self.broken = True  # The renderer exited early, finish reports its error
+
+    def finish(self):
+        """
+        Completes the file. Returns an error message if the renderer failed.
+        """
+        self.write(self.footer)
+        self._close_stream()
+        if self.process is not None and self.process.wait() != 0:
+            self.stderr.seek(0)
+            return f"Error generating {self.format.upper()} image: {self.stderr.read().decode(errors='replace')}"
+        return None
+
+    def commit(self):
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self._close_stream()
+        if self.process is not None:
+            self.process.kill()  # Does nothing if it has already exited
+            self.process.wait()
+            self.stderr.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def _close_stream(self):
+        try:
+            self.stream.close()
+        except BrokenPipeError:
+            pass
+
+def visualize_graph(graph, viz_tool, formats=('svg',), output_dir='.', name='dependency_graph'):
+    """
+    Writes the graph to output_dir/name.<format> for each of the formats. The code is generated once
+    and streamed to all outputs together: one `viz_tool -pipe` process per rendered format, so the
+    images are rendered concurrently without an intermediate file. Returns the written paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = []
+    try:
+        for output_format in dict.fromkeys(formats):
+            outputs.append(_Output(output_format, os.path.join(output_dir, f"{name}.{output_format}"), viz_tool))
+        with PROFILE.phase('plantuml'):
+            for chunk in _iter_elements(graph):
+                for output in outputs:
+                    output.write(chunk)
+        # Renderers work while the code is streamed; what is left is waiting for them to finish
+        with PROFILE.phase('render'):
+            errors = [error for error in (output.finish() for output in outputs) if error]
+        if errors:
+            print('\n'.join(errors), file=sys.stderr)
+            sys.exit(1)
+        for output in outputs:
+            output.commit()
+    finally:
+        for output in outputs:
+            output.discard()
+
+    for output in outputs:
+        if output.format == 'svg':
+            print(f"SVG image generated at: {output.path}")
+            print("You can open it in a web browser or vector graphics editor to zoom without loss of quality.")
+        elif output.format == 'png':
+            print(f"Image generated at: {output.path}")
+        else:
+            print(f"{output.format.upper()} code written to: {output.path}")
+    return [output.path for output in outputs]
 
 class TestDependencyGraph(unittest.TestCase):
 
@@ -173,17 +1407,299 @@ class TestDependencyGraph(unittest.TestCase):
             self.assertIn('parents', data)
             self.assertIn('files_folders', data)
 
+    def test_build_dependency_graph_matches_per_commit_queries(self):
+        os.makedirs(os.path.join(self.tmp_repo.name, 'src', 'lib'))
+        with open(os.path.join(self.tmp_repo.name, 'src', 'lib', 'util.py'), 'w') as f:
+            f.write('pass')
+        subprocess.run(['git', 'add', 'src'], cwd=self.tmp_repo.name)
+        subprocess.run(['git', 'commit', '-m', 'Nested file'], cwd=self.tmp_repo.name)
+        graph = build_dependency_graph(self.tmp_repo.name)
+        self.assertEqual(list(graph), get_commits(self.tmp_repo.name))
+        for commit, data in graph.items():
+            self.assertEqual(data['parents'], get_parents(self.tmp_repo.name, commit))
+            self.assertEqual(data['files_folders'], get_files_and_folders(self.tmp_repo.name, commit))
+        self.assertIn('src/lib', graph[get_commits(self.tmp_repo.name)[0]]['files_folders'])
+
+    def test_tree_cache_reuses_unchanged_subtrees(self):
+        os.makedirs(os.path.join(self.tmp_repo.name, 'src', 'lib'))
+        with open(os.path.join(self.tmp_repo.name, 'src', 'lib', 'util.py'), 'w') as f:
+            f.write('pass')
+        subprocess.run(['git', 'add', 'src'], cwd=self.tmp_repo.name)
+        subprocess.run(['git', 'commit', '-m', 'Nested file'], cwd=self.tmp_repo.name)
+        with open(os.path.join(self.tmp_repo.name, 'file1.txt'), 'w') as f:
+            f.write('Changed')
+        subprocess.run(['git', 'commit', '-am', 'Top-level change'], cwd=self.tmp_repo.name)
+        commits = get_commits(self.tmp_repo.name)
+        with GitObjectReader(self.tmp_repo.name) as reader:
+            tree_cache = TreeListingCache(reader)
+            for commit in commits:
+                self.assertEqual(get_files_and_folders(self.tmp_repo.name, commit, tree_cache=tree_cache),
+                                 get_files_and_folders(self.tmp_repo.name, commit))
+            # Only the root tree changed in the last commit, src/ and src/lib/ came from the cache
+            self.assertEqual(tree_cache.stats()['hits'], 1)
+            # Listings over the bound are evicted, the most recent one is kept
+            small_cache = TreeListingCache(reader, max_paths=3)
+            small_cache.list(reader.commit_tree(commits[0]))
+            self.assertEqual(len(small_cache.listings), 1)
+
+    def test_commit_graph_deltas_follow_branches_and_deletions(self):
+        repo = self.tmp_repo.name
+        subprocess.run(['git', 'checkout', '-q', '-b', 'side'], cwd=repo)
+        os.makedirs(os.path.join(repo, 'docs'))
+        with open(os.path.join(repo, 'docs', 'guide.md'), 'w') as f:
+            f.write('Guide')
+        subprocess.run(['git', 'add', 'docs'], cwd=repo)
+        subprocess.run(['git', 'commit', '-m', 'Docs'], cwd=repo)
+        subprocess.run(['git', 'checkout', '-q', '-'], cwd=repo)
+        subprocess.run(['git', 'rm', '-q', 'file2.txt'], cwd=repo)
+        os.makedirs(os.path.join(repo, 'file2.txt'))
+        with open(os.path.join(repo, 'file2.txt', 'inner.txt'), 'w') as f:
+            f.write('File turned into a folder')
+        subprocess.run(['git', 'add', 'file2.txt'], cwd=repo)
+        subprocess.run(['git', 'commit', '-m', 'Replace file2.txt'], cwd=repo)
+        subprocess.run(['git', 'merge', '-q', '--no-edit', 'side'], cwd=repo)
+        subprocess.run(['git', 'rm', '-q', '-r', 'docs'], cwd=repo)
+        subprocess.run(['git', 'commit', '-m', 'Drop docs'], cwd=repo)
+        graph = build_dependency_graph(repo)
+        commits = get_commits(repo)
+        self.assertEqual(len(graph), 6)
+        # Oldest first, so that every commit is rebuilt from its deltas or from a newer child
+        for commit in reversed(commits):
+            self.assertEqual(graph[commit]['files_folders'], get_files_and_folders(repo, commit))
+            self.assertEqual(graph[commit]['parents'], get_parents(repo, commit))
+        fresh = build_dependency_graph(repo)
+        for commit in commits:
+            self.assertEqual(fresh.files_folders(commit), get_files_and_folders(repo, commit))
+
+    def test_parallel_build_matches_serial(self):
+        for i in range(3, 8):
+            with open(os.path.join(self.tmp_repo.name, f'file{i}.txt'), 'w') as f:
+                f.write(str(i))
+            subprocess.run(['git', 'add', '.'], cwd=self.tmp_repo.name)
+            subprocess.run(['git', 'commit', '-m', f'Commit {i}'], cwd=self.tmp_repo.name)
+        serial = build_dependency_graph(self.tmp_repo.name)
+        parallel = build_dependency_graph(self.tmp_repo.name, jobs=3)
+        self.assertEqual(list(parallel), list(serial))
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel.paths, serial.paths)
+        self.assertEqual(generate_plantuml(parallel), generate_plantuml(serial))
+
+    def test_graph_cache_reads_only_new_commits(self):
+        repo = self.tmp_repo.name
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.assertEqual(update_dependency_graph(repo, cache_dir), build_dependency_graph(repo))
+            with open(os.path.join(repo, 'file3.txt'), 'w') as f:
+                f.write('New file')
+            subprocess.run(['git', 'add', 'file3.txt'], cwd=repo)
+            subprocess.run(['git', 'commit', '-m', 'Third commit'], cwd=repo)
+            stats = {}
+            graph = update_dependency_graph(repo, cache_dir, stats=stats)
+            self.assertEqual(graph, build_dependency_graph(repo))
+            self.assertEqual(list(graph), get_commits(repo))
+            # Only the new commit and the cached tip it is diffed against were read
+            self.assertEqual(stats['misses'], 2)
+            # A merged side branch with older commit dates: the order is still that of rev-list
+            update_dependency_graph(repo, os.path.join(cache_dir, 'native'), backend='native')
+            env = dict(os.environ, GIT_AUTHOR_DATE='2000-01-01T00:00:00', GIT_COMMITTER_DATE='2000-01-01T00:00:00')
+            subprocess.run(['git', 'checkout', '-q', '-b', 'old', 'HEAD~2'], cwd=repo)
+            with open(os.path.join(repo, 'old.txt'), 'w') as f:
+                f.write('Old file')
+            subprocess.run(['git', 'add', 'old.txt'], cwd=repo)
+            subprocess.run(['git', 'commit', '-q', '-m', 'Old commit'], cwd=repo, env=env)
+            subprocess.run(['git', 'checkout', '-q', '-'], cwd=repo)
+            subprocess.run(['git', 'merge', '-q', '--no-edit', 'old'], cwd=repo)
+            for path, backend in ((cache_dir, 'git'), (os.path.join(cache_dir, 'native'), 'native')):
+                graph = update_dependency_graph(repo, path, backend=backend)
+                self.assertEqual(graph, build_dependency_graph(repo))
+                self.assertEqual(list(graph), get_commits(repo))
+                self.assertEqual(list(graph), list(build_dependency_graph(repo)))
+            # Unchanged refs: the cached graph as is
+            self.assertEqual(update_dependency_graph(repo, cache_dir, stats=stats), graph)
+            self.assertEqual(stats['misses'], 0)
+            # A rewritten commit drops the cache
+            subprocess.run(['git', 'commit', '--amend', '-m', 'Rewritten'], cwd=repo)
+            graph = update_dependency_graph(repo, cache_dir)
+            self.assertEqual(graph, build_dependency_graph(repo))
+            self.assertEqual(len(graph), 5)
+
+    def test_summarize_graph_collapses_linear_runs(self):
+        repo = self.tmp_repo.name
+        subprocess.run(['git', 'checkout', '-q', '-b', 'side'], cwd=repo)
+        for name in ('a.txt', 'b.txt'):
+            with open(os.path.join(repo, name), 'w') as f:
+                f.write(name)
+            subprocess.run(['git', 'add', name], cwd=repo)
+            subprocess.run(['git', 'commit', '-m', name], cwd=repo)
+        subprocess.run(['git', 'checkout', '-q', '-'], cwd=repo)
+        subprocess.run(['git', 'rm', '-q', 'file1.txt'], cwd=repo)
+        subprocess.run(['git', 'commit', '-m', 'Remove file1.txt'], cwd=repo)
+        subprocess.run(['git', 'merge', '-q', '--no-edit', 'side'], cwd=repo)
+        graph = build_dependency_graph(repo)
+        # initial -> second, then side: a -> b and master: remove, then the merge
+        summary = summarize_graph(graph, 'delta', max_paths=1)
+        self.assertEqual(len(summary), 4)
+        first = next(commit for commit, data in graph.items() if not data['parents'])
+        second = next(commit for commit, data in graph.items() if data['parents'] == [first])
+        head = next(commit for commit, data in graph.items() if len(data['parents']) == 2)
+        self.assertEqual(summary[second]['label'][:3], [f"Commits: {first[:7]}..{second[:7]} (2)",
+                                                     "Files/Folders: +2 -0", "+ file1.txt"])
+        self.assertEqual(summary[second]['label'][3], "... 1 more")
+        self.assertEqual(len(summary[head]['parents']), 2)
+        side_run = [node for node in summary if node not in (head, second) and
+                    summary[node]['label'][0].startswith('Commits:')]
+        self.assertEqual(len(side_run), 1)
+        self.assertEqual(summary[side_run[0]]['parents'], [second])
+        self.assertEqual(summarize_graph(graph, 'counts')[side_run[0]]['label'][1:], ["Files/Folders: +2 -0"])
+        uml_code = generate_plantuml(summary)
+        self.assertEqual(uml_code.count('" -> "'), 4)
+        self.assertIn('\\n+ file1.txt\\n', uml_code)
+
+    def test_native_backend_matches_git(self):
+        repo = self.tmp_repo.name
+        os.makedirs(os.path.join(repo, 'src', 'lib'))
+        with open(os.path.join(repo, 'src', 'lib', 'util.py'), 'w') as f:
+            f.write('pass')
+        subprocess.run(['git', 'add', 'src'], cwd=repo)
+        subprocess.run(['git', 'commit', '-m', 'Nested file'], cwd=repo)
+        subprocess.run(['git', 'tag', '-a', '-m', 'Release', 'v1'], cwd=repo)
+        # Branches with equal committer dates: the order then depends on the start points alone
+        same_date = dict(os.environ, GIT_AUTHOR_DATE='2020-01-01T00:00:00', GIT_COMMITTER_DATE='2020-01-01T00:00:00')
+        for branch in ('x', 'y', 'z'):
+            subprocess.run(['git', 'checkout', '-q', '-b', branch, 'v1'], cwd=repo)
+            for i in range(3):
+                subprocess.run(['git', 'commit', '-q', '--allow-empty', '-m', f'{branch}{i}'], cwd=repo, env=same_date)
+        # Loose objects first, then one pack with ofs deltas and one with ref deltas
+        for repack in ([], ['git', 'repack', '-adq'],
+                       ['git', '-c', 'repack.useDeltaBaseOffset=false', 'repack', '-adfq']):
+            if repack:
+                subprocess.run(repack, cwd=repo)
+            self.assertEqual(get_refs(repo, 'native'), get_refs(repo))
+            for max_commits in (None, 4):
+                self.assertEqual(get_commits(repo, max_commits, backend='native'), get_commits(repo, max_commits))
+            for commit in get_commits(repo):
+                self.assertEqual(get_parents(repo, commit, 'native'), get_parents(repo, commit))
+                self.assertEqual(get_files_and_folders(repo, commit, backend='native'),
+                                 get_files_and_folders(repo, commit))
+            self.assertEqual(build_dependency_graph(repo, backend='native'), build_dependency_graph(repo))
+        # A shallow clone, and a clone that reads the objects of repo through objects/info/alternates
+        for options in (['--depth', '2'], ['--shared']):
+            with tempfile.TemporaryDirectory() as clone:
+                subprocess.run(['git', 'clone', '-q', *options, 'file://' + repo, clone], check=True)
+                self.assertEqual(get_commits(clone, backend='native'), get_commits(clone))
+                for commit in get_commits(clone):
+                    self.assertEqual(get_parents(clone, commit, 'native'), get_parents(clone, commit))
+                self.assertEqual(build_dependency_graph(clone, backend='native'), build_dependency_graph(clone))
+
+    def test_profile_counts_phases_and_processes(self):
+        profile = PROFILE.report()
+        graph = build_dependency_graph(self.tmp_repo.name)
+        report = PROFILE.report()
+        # One rev-list and one cat-file process, whatever the number of commits
+        self.assertEqual(report['subprocesses'] - profile['subprocesses'], 2)
+        self.assertGreater(report['git_bytes_read'], profile['git_bytes_read'])
+        for phase in ('commits', 'trees'):
+            self.assertEqual(report['phases'][phase]['calls'] - profile['phases'].get(phase, {}).get('calls', 0), 1)
+            self.assertGreaterEqual(report['phases'][phase]['wall'], 0)
+        self.assertEqual(json.loads(json.dumps(report)), report)
+        self.assertEqual(len(graph), 2)
+
     def test_generate_plantuml(self):
         graph = build_dependency_graph(self.tmp_repo.name)
         uml_code = generate_plantuml(graph)
         self.assertIn('@startuml', uml_code)
         self.assertIn('@enduml', uml_code)
 
-if __name__ == '__main__':
-    args = parse_args()
+    def test_write_plantuml_streams_the_same_code(self):
+        graph = CommitGraph()
+        graph.add('a' * 40, [], None, ['src', 'src/"q".py'])
+        graph.add('b' * 40, ['a' * 40, 'c' * 40], 'a' * 40, ['README'])
+        expected = '\n'.join([
+            '@startuml', 'digraph G {', 'node [shape=box];', 'skinparam dpi 150', 'skinparam defaultFontSize 12',
+            f'"{"a" * 40}" [label="Commit: aaaaaaa\\nFiles/Folders:\\nsrc\\nsrc/\\"q\\".py"];',
+            f'"{"b" * 40}" [label="Commit: bbbbbbb\\nFiles/Folders:\\nREADME\\nsrc\\nsrc/\\"q\\".py"];',
+            f'"{"a" * 40}" -> "{"b" * 40}";',
+            '}', '@enduml'])
+        self.assertEqual(generate_plantuml(graph), expected)
+        with tempfile.TemporaryFile('w+') as f:
+            write_plantuml(graph, f)
+            f.seek(0)
+            self.assertEqual(f.read(), expected)
+
+    def test_visualize_graph_renders_formats_from_one_stream(self):
+        graph = build_dependency_graph(self.tmp_repo.name)
+        with tempfile.TemporaryDirectory() as tmp:
+            # A stand-in renderer: prints its format option and copies the diagram from stdin
+            viz_tool = os.path.join(tmp, 'fake_plantuml')
+            with open(viz_tool, 'w') as f:
+                f.write(f"#!{sys.executable}\nimport sys\n"
+                        "sys.stdout.write(sys.argv[-1] + '\\n' + sys.stdin.read())\n")
+            os.chmod(viz_tool, 0o755)
+            output_dir = os.path.join(tmp, 'out')
+            paths = visualize_graph(graph, viz_tool, ['svg', 'png', 'dot', 'uml'], output_dir, 'graph')
+            self.assertEqual(sorted(os.listdir(output_dir)), ['graph.dot', 'graph.png', 'graph.svg', 'graph.uml'])
+            contents = {}
+            for path in paths:
+                with open(path) as f:
+                    contents[os.path.splitext(path)[1]] = f.read()
+            uml_code = generate_plantuml(graph)
+            self.assertEqual(contents['.uml'], uml_code)
+            self.assertEqual(contents['.svg'], '-tsvg\n' + uml_code)
+            self.assertEqual(contents['.png'], '-tpng\n' + uml_code)
+            self.assertTrue(contents['.dot'].startswith('digraph G {'))
+            self.assertNotIn('@startuml', contents['.dot'])
+
+    def test_visualize_graph_without_renderer_leaves_nothing(self):
+        graph = build_dependency_graph(self.tmp_repo.name)
+        with tempfile.TemporaryDirectory() as tmp:
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit) as raised:
+                visualize_graph(graph, os.path.join(tmp, 'missing_plantuml'), ['uml', 'svg'], tmp, 'graph')
+            self.assertEqual(raised.exception.code, 1)
+            self.assertTrue(stderr.getvalue().startswith('Error generating SVG image:'))
+            self.assertEqual(os.listdir(tmp), [])
+
+def main(default_formats=('svg',)):
+    args = parse_args(default_formats)
     if len(sys.argv) > 1 and sys.argv[1] == 'test':
         unittest.main(argv=sys.argv[:1])
+        return
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        run(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        if args.profile:
+            report = json.dumps(PROFILE.report(), indent=2)
+            if args.profile == '-':
+                print(report, file=sys.stderr)
+            else:
+                with open(args.profile, 'w') as f:
+                    f.write(report + '\n')
+
+def run(args):
+    """
+    Builds the graph and writes the outputs as requested by the command line arguments.
+    """
+    cache_stats = {}
+    if args.graph_cache and not (args.max_commits or args.since or args.until):
+        dependency_graph = update_dependency_graph(args.repo_path, args.graph_cache, args.tree_cache_size,
+                                                   cache_stats, args.jobs, args.backend)
     else:
-        dependency_graph = build_dependency_graph(args.repo_path, args.max_commits, args.since, args.until)
-        plantuml_code = generate_plantuml(dependency_graph)
-        visualize_graph(plantuml_code, args.viz_tool)
\ No newline at end of file
+        if args.graph_cache:
+            print("The graph cache covers the whole history, ignoring it for a limited one", file=sys.stderr)
+        dependency_graph = build_dependency_graph(args.repo_path, args.max_commits, args.since, args.until,
+                                                  args.tree_cache_size, cache_stats, args.jobs, args.backend)
+    if args.cache_stats:
+        print("Tree cache: {hits} hits, {misses} misses, {listings} listings, {paths} paths".format(**cache_stats),
+              file=sys.stderr)
+    if args.detail != 'full':
+        with PROFILE.phase('summarize'):
+            dependency_graph = summarize_graph(dependency_graph, args.detail, args.max_paths)
+    visualize_graph(dependency_graph, args.viz_tool, args.formats, args.output_dir, args.output_name)
+
+if __name__ == '__main__':
+    main()